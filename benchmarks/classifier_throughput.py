@@ -0,0 +1,103 @@
+# C:/Development/Projects/Demented-Discord-Bot/benchmarks/classifier_throughput.py
+
+"""
+Measures the CPU throughput of the local message classifier at different batch sizes.
+
+Loads the sentiment and toxicity models the same way a classifier worker process does (one
+torch thread), then scores batches of chat-length messages for batch sizes 1 to 64. It
+prints the time per batch and the messages scored per second for each size, which is what
+AI_SETTINGS.CLASSIFIER.MAX_BATCH should be picked from. Needs `transformers` and `torch`,
+and downloads the models on first run.
+
+With --offline, nothing is downloaded: the default architectures (DistilBERT-base for
+sentiment, BERT-base for toxicity) are built with random weights and a small local WordPiece
+vocabulary that covers the sample messages. Inference cost depends on the architecture and
+sequence length, not on the weight values, so the timings match the real models closely;
+the scores themselves are meaningless.
+
+Usage: python -m benchmarks.classifier_throughput [--seconds 3] [--offline]
+                                                  [--sentiment-model NAME] [--toxicity-model NAME]
+"""
+import argparse
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from data import sentiment_classifier as sc
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+
+SAMPLE_MESSAGES = [
+    "lol you're actually the worst bot I've ever talked to",
+    "thanks for the help earlier, that fixed it",
+    "does anyone know when the event starts tonight?",
+    "honestly this server has the best memes",
+    "shut up nobody asked you",
+    "I just got back from the gym and I'm dead tired",
+    "you're pretty funny for a bunch of code ngl",
+    "can someone explain what happened in the last episode, I missed it because of work",
+]
+
+
+def _offline_classifiers():
+    import torch
+    from transformers import (BertConfig, BertForSequenceClassification, BertTokenizerFast,
+                              DistilBertConfig, DistilBertForSequenceClassification)
+
+    torch.set_num_threads(1)
+    words = sorted({word for message in SAMPLE_MESSAGES for word in re.findall(r"\w+|[^\w\s]", message.lower())})
+    vocab_file = Path(tempfile.mkdtemp()) / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words), encoding="utf-8")
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file))
+
+    sentiment = DistilBertForSequenceClassification(DistilBertConfig(
+        num_labels=2, id2label={0: "NEGATIVE", 1: "POSITIVE"}, label2id={"NEGATIVE": 0, "POSITIVE": 1}))
+    toxic_labels = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+    toxicity = BertForSequenceClassification(BertConfig(
+        num_labels=len(toxic_labels), problem_type="multi_label_classification",
+        id2label=dict(enumerate(toxic_labels)), label2id={label: i for i, label in enumerate(toxic_labels)}))
+    return sc.prepare_classifier(tokenizer, sentiment), sc.prepare_classifier(tokenizer, toxicity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0, help="time spent on each batch size")
+    parser.add_argument("--sentiment-model", default=sc.DEFAULT_SENTIMENT_MODEL)
+    parser.add_argument("--toxicity-model", default=sc.DEFAULT_TOXICITY_MODEL,
+                        help="pass an empty string to time the sentiment model alone")
+    parser.add_argument("--offline", action="store_true",
+                        help="time the default architectures with random weights instead of downloading models")
+    args = parser.parse_args()
+
+    if not sc.transformers_available:
+        parser.error("`transformers` and `torch` are required: pip install transformers torch")
+
+    started = time.perf_counter()
+    if args.offline:
+        sentiment, toxicity = _offline_classifiers()
+        sc._worker_models[:] = [sentiment, toxicity if args.toxicity_model else None]
+        sc.classify_batch(["warm-up"])
+    else:
+        sc.init_worker(args.sentiment_model, args.toxicity_model)
+    print(f"Models loaded and warmed up in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(0)
+    print(f"{'batch':>6}{'ms/batch':>12}{'msgs/s':>10}{'speedup':>10}")
+    baseline = None
+    for size in BATCH_SIZES:
+        batches = 0
+        deadline = time.perf_counter() + args.seconds
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            sc.classify_batch([rng.choice(SAMPLE_MESSAGES) for _ in range(size)])
+            batches += 1
+        elapsed = time.perf_counter() - started
+        throughput = batches * size / elapsed
+        baseline = baseline or throughput
+        print(f"{size:>6}{elapsed / batches * 1000:>12.1f}{throughput:>10.0f}{throughput / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# C:/Development/Projects/Demented-Discord-Bot/benchmarks/fact_search.py
+
+"""
+Measures semantic fact search latency with a large fact table.
+
+Fills a throwaway database with facts and random unit vectors (embedding dimension of the
+default model), so only NumPy is needed; the sentence model itself is not timed. Two paths
+are then timed per query:
+
+- "per message": loads the embeddings of a speaker and two mentioned users from SQLite,
+  scores them with one matrix product and keeps the top k per user, as
+  FactEmbeddingIndex.get_relevant_facts does.
+- "all facts in memory": scores every fact in one matrix already held in memory, as a
+  reference for what a single brute-force pass over the whole table costs.
+
+Usage: python -m benchmarks.fact_search [--facts 100000] [--users 1000] [--queries 200]
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data import database_manager as dbm
+from data.fact_embeddings import encode_vector, decode_vectors, top_k_per_group
+
+MODEL = "benchmark"
+DIMENSIONS = 384
+TOP_K = 3
+
+
+def _unit_vectors(count: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _seed(facts: int, users: int, rng: np.random.Generator) -> np.ndarray:
+    conn = dbm.db_manager.get_connection()
+    with conn:
+        conn.executemany("INSERT INTO user_facts (fact_id, user_id, fact_text, added_by_id) VALUES (?, ?, ?, 0)",
+                         ((fact_id, fact_id % users, f"fact number {fact_id}") for fact_id in range(1, facts + 1)))
+    vectors = _unit_vectors(facts, rng)
+    dbm.store_fact_embeddings(MODEL, [(fact_id, fact_id % users, encode_vector(vectors[fact_id - 1]))
+                                      for fact_id in range(1, facts + 1)])
+    return vectors
+
+
+def _percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facts", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    dbm.db_manager = dbm.DatabaseManager(Path(tempfile.mkdtemp()) / "bench.db")
+    dbm.setup_database()
+    rng = np.random.default_rng(0)
+    all_vectors = _seed(args.facts, args.users, rng)
+    queries = _unit_vectors(args.queries, rng)
+
+    per_message = []
+    for query in queries:
+        user_ids = random.sample(range(args.users), 3)
+        started = time.perf_counter()
+        rows = dbm.get_fact_embeddings(user_ids, MODEL)
+        matrix = decode_vectors([vector for _, _, vector in rows])
+        groups = np.fromiter((user_id for user_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        top_k_per_group(matrix @ query, groups, TOP_K)
+        per_message.append(time.perf_counter() - started)
+
+    in_memory = []
+    for query in queries:
+        started = time.perf_counter()
+        scores = all_vectors @ query
+        best = np.argpartition(-scores, TOP_K)[:TOP_K]
+        best[np.argsort(-scores[best])]
+        in_memory.append(time.perf_counter() - started)
+
+    print(f"{args.facts} facts across {args.users} users ({args.facts // args.users} per user), "
+          f"{DIMENSIONS}-d float16 vectors, top {TOP_K}, {args.queries} queries")
+    print(f"{'path':<26}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'per message (3 users)':<26}{_percentiles(per_message)}")
+    print(f"{'all facts in memory':<26}{_percentiles(in_memory)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# C:/Development/Projects/Demented-Discord-Bot/benchmarks/verification_loop_lag.py
+
+"""
+Measures event-loop lag while a simulated /verify pull-all runs against a local stub
+of the Discord "add guild member" endpoint.
+
+A ticker coroutine asks to wake up every few milliseconds and records how late it
+actually wakes. That lateness is how long the bot would be unable to process gateway
+events. The same batch of PUT requests is sent once with blocking `requests` calls made
+inside a coroutine (the old VerificationCog behaviour) and once through `discord_request`.
+
+Usage: python -m benchmarks.verification_loop_lag [--users 100] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+from data.discord_api import discord_request
+from data.session_manager import SessionManager
+
+TICK_INTERVAL = 0.005
+
+
+async def _ticker(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _start_stub(latency: float, port: int) -> web.AppRunner:
+    async def add_member(request: web.Request):
+        await asyncio.sleep(latency)
+        return web.Response(status=201, text='{"user": {"id": "%s"}}' % request.match_info["user_id"],
+                            content_type="application/json")
+
+    app = web.Application()
+    app.router.add_put("/guilds/{guild_id}/members/{user_id}", add_member)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def _pull_blocking(base_url: str, users: int):
+    for user_id in range(users):
+        requests.put(f"{base_url}/guilds/1/members/{user_id}", json={"access_token": "x"})
+
+
+async def _pull_async(base_url: str, users: int):
+    for user_id in range(users):
+        await discord_request("PUT", f"{base_url}/guilds/1/members/{user_id}", json={"access_token": "x"})
+
+
+async def _measure(name: str, pull, base_url: str, users: int) -> dict:
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await pull(base_url, users)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return {
+        "name": name,
+        "elapsed": elapsed,
+        "max_lag_ms": max(lags, default=0.0) * 1000,
+        "p99_lag_ms": (statistics.quantiles(lags, n=100)[98] if len(lags) >= 100 else max(lags, default=0.0)) * 1000,
+        "ticks": len(lags),
+    }
+
+
+async def main(users: int, latency_ms: float, port: int):
+    # The stub runs on its own loop in a background thread. If it shared the measured loop,
+    # the blocking client would wait forever on a server that cannot run while it blocks.
+    stub_loop = asyncio.new_event_loop()
+    threading.Thread(target=stub_loop.run_forever, daemon=True).start()
+    runner = asyncio.run_coroutine_threadsafe(_start_stub(latency_ms / 1000, port), stub_loop).result()
+
+    base_url = f"http://127.0.0.1:{port}"
+    results = [
+        await _measure("requests (blocking)", _pull_blocking, base_url, users),
+        await _measure("discord_request (async)", _pull_async, base_url, users),
+    ]
+    await SessionManager.close()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), stub_loop).result()
+    stub_loop.call_soon_threadsafe(stub_loop.stop)
+
+    print(f"{users} sequential PUTs, {latency_ms:.0f}ms stub latency, {TICK_INTERVAL * 1000:.0f}ms ticker")
+    print(f"{'client':<26}{'elapsed s':>10}{'ticks':>8}{'p99 lag ms':>12}{'max lag ms':>12}")
+    for r in results:
+        print(f"{r['name']:<26}{r['elapsed']:>10.2f}{r['ticks']:>8}{r['p99_lag_ms']:>12.1f}{r['max_lag_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.latency_ms, args.port))
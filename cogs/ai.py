@@ -1,41 +1,39 @@
 # C:/Development/Projects/Demented-Discord-Bot/cogs/ai.py
 import os
+import asyncio
 import logging
 import random
 import json
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-from collections import deque
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Callable, Awaitable, Set
 
 from data.utils import get_config_value
-from data.session_manager import cached_http_get
+from data.session_manager import cached_http_get, SessionManager
+from data.gemini_cache import GeminiContextCache
+from data.conversation_store import ConversationStore
+from data.line_pool import LinePools
+from data.sentiment_classifier import (
+    SentimentClassifier, DEFAULT_SENTIMENT_MODEL, DEFAULT_TOXICITY_MODEL
+)
+from data.fact_embeddings import FactEmbeddingIndex, DEFAULT_MODEL as DEFAULT_EMBEDDING_MODEL
+from data.gemini_stream import stream_gemini_text, partial_json_string, GeminiStreamError, ProgressiveMessage
+from data.ai_scheduler import (
+    AIRequestScheduler, RequestShedError, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+)
 # --- MODIFICATION: Update prompt imports ---
-from utils.prompts import SYSTEM_PROMPT, CREATOR_CONTEXT_PROMPT, BOT_MOOD_PROMPT
-from data.database_manager import (
-    add_user_fact, get_user_facts, get_user_sentiment, update_user_sentiment,
-    get_all_guilds_with_autonomy, get_server_config_value
+from utils.prompts import FACT_EXTRACTION_PROMPT, LINE_POOL_PROMPT, LINE_POOL_DESCRIPTIONS
+from utils.prompt_builder import PromptBuilder
+from data.async_database import (
+    add_user_fact, get_user_memories, get_user_sentiment, update_user_sentiment,
+    get_all_guilds_with_autonomy, get_guild_config, compact_conversation_turns
 )
 
 logger = logging.getLogger('demented_bot.ai')
 
-
-class ConversationManager:
-    def __init__(self):
-        self.histories = {}
-
-    def get_history(self, channel_id: int, max_length: int) -> list:
-        if channel_id not in self.histories:
-            self.histories[channel_id] = deque(maxlen=max_length)
-        if self.histories[channel_id].maxlen != max_length:
-            self.histories[channel_id] = deque(self.histories[channel_id], maxlen=max_length)
-        return list(self.histories[channel_id])
-
-    def add_to_history(self, channel_id: int, role: str, content: str, max_length: int):
-        if channel_id not in self.histories or self.histories[channel_id].maxlen != max_length:
-            self.histories[channel_id] = deque(maxlen=max_length)
-        self.histories[channel_id].append({"role": role, "content": content})
+PartialCallback = Callable[[str], Awaitable[None]]
 
 
 class AICog(commands.Cog, name="AI"):
@@ -44,21 +42,107 @@ class AICog(commands.Cog, name="AI"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.api_key = os.getenv("GEMINI_API_KEY")
-        self.conversation_manager = ConversationManager()
+        self.conversation_store = ConversationStore(
+            max_channels=get_config_value(bot, "AI_SETTINGS.MAX_CONVERSATION_CHANNELS", 2000),
+            max_chars=get_config_value(bot, "AI_SETTINGS.MAX_CONVERSATION_CHARS", 4_000_000),
+            idle_seconds=get_config_value(bot, "AI_SETTINGS.CONVERSATION_IDLE_MINUTES", 360) * 60,
+            persistent=get_config_value(bot, "AI_SETTINGS.PERSIST_CONVERSATIONS", True)
+        )
         self.boredom = 0.0
         self.autonomy_enabled = get_config_value(bot, "AUTONOMY_SETTINGS.ENABLED", False)
         self.last_autonomously_tagged_user: Dict[int, int] = {}
+        self.prompt_builder = PromptBuilder(
+            prompt_budget=get_config_value(bot, "AI_SETTINGS.PROMPT_TOKEN_BUDGET", 8000),
+            memory_budget=get_config_value(bot, "AI_SETTINGS.MEMORY_TOKEN_BUDGET", 1500)
+        )
+        self.fact_index: Optional[FactEmbeddingIndex] = None
+        if get_config_value(bot, "AI_SETTINGS.EMBEDDINGS.ENABLED", False):
+            self.fact_index = FactEmbeddingIndex(
+                model_name=get_config_value(bot, "AI_SETTINGS.EMBEDDINGS.MODEL", DEFAULT_EMBEDDING_MODEL),
+                min_score=get_config_value(bot, "AI_SETTINGS.EMBEDDINGS.MIN_SCORE", 0.2)
+            )
+            if not self.fact_index.available:
+                logger.warning("`numpy`/`transformers`/`torch` not found. Facts will be picked by recency instead of "
+                               "relevance. Install with: pip install numpy transformers torch")
+                self.fact_index = None
+        self.classifier: Optional[SentimentClassifier] = None
+        self._sentiment_tasks: Set[asyncio.Task] = set()
+        if get_config_value(bot, "AI_SETTINGS.CLASSIFIER.ENABLED", False):
+            self.classifier = SentimentClassifier(
+                sentiment_model=get_config_value(bot, "AI_SETTINGS.CLASSIFIER.SENTIMENT_MODEL", DEFAULT_SENTIMENT_MODEL),
+                toxicity_model=get_config_value(bot, "AI_SETTINGS.CLASSIFIER.TOXICITY_MODEL", DEFAULT_TOXICITY_MODEL),
+                workers=get_config_value(bot, "AI_SETTINGS.CLASSIFIER.WORKERS", 1),
+                max_batch=get_config_value(bot, "AI_SETTINGS.CLASSIFIER.MAX_BATCH", 32),
+                max_delay=get_config_value(bot, "AI_SETTINGS.CLASSIFIER.MAX_BATCH_DELAY_MS", 15) / 1000
+            )
+            if not self.classifier.available:
+                logger.warning("`transformers`/`torch` not found. Insults and compliments will use fixed sentiment "
+                               "changes. Install with: pip install transformers torch")
+                self.classifier = None
+        self.context_cache: Optional[GeminiContextCache] = None
+        if self.api_key and get_config_value(bot, "AI_SETTINGS.CONTEXT_CACHE.ENABLED", False):
+            api_base_endpoint = get_config_value(bot, "AI_SETTINGS.API_ENDPOINT", "")
+            self.context_cache = GeminiContextCache(
+                endpoint=get_config_value(bot, "AI_SETTINGS.CONTEXT_CACHE.ENDPOINT",
+                                          api_base_endpoint.strip('/').rsplit('/models', 1)[0] + "/cachedContents"),
+                api_key=self.api_key,
+                ttl_seconds=get_config_value(bot, "AI_SETTINGS.CONTEXT_CACHE.TTL_SECONDS", 3600),
+                refresh_margin=get_config_value(bot, "AI_SETTINGS.CONTEXT_CACHE.REFRESH_MARGIN_SECONDS", 300),
+                min_tokens=get_config_value(bot, "AI_SETTINGS.CONTEXT_CACHE.MIN_TOKENS", 1024)
+            )
+            # Creating a cache for a prompt below the model's minimum always fails, so don't try.
+            largest_prompt_tokens = self.prompt_builder.get_static_prompt(True)[1]
+            if not self.context_cache.is_cacheable(largest_prompt_tokens):
+                logger.info(f"System prompt (~{largest_prompt_tokens} tokens) is below the "
+                            f"{self.context_cache.min_tokens}-token minimum for Gemini context caching. "
+                            f"Sending it inline instead.")
+                self.context_cache = None
+        self.scheduler = AIRequestScheduler(
+            max_concurrent=get_config_value(bot, "AI_SETTINGS.MAX_CONCURRENT_REQUESTS", 8),
+            max_per_guild=get_config_value(bot, "AI_SETTINGS.MAX_CONCURRENT_PER_GUILD", 3),
+            shed_queue_depth=get_config_value(bot, "AI_SETTINGS.SHED_QUEUE_DEPTH", 16)
+        )
+
+        self.line_pools: Optional[LinePools] = None
+        if get_config_value(bot, "AI_SETTINGS.LINE_POOLS.ENABLED", False):
+            self.line_pools = LinePools(
+                LINE_POOL_DESCRIPTIONS,
+                max_size=get_config_value(bot, "AI_SETTINGS.LINE_POOLS.POOL_SIZE", 20),
+                low_water=get_config_value(bot, "AI_SETTINGS.LINE_POOLS.LOW_WATER", 5)
+            )
 
         if not self.api_key:
             logger.warning("GEMINI_API_KEY not found. AI features will be disabled.")
 
         if self.autonomy_enabled:
             self.autonomy_loop.start()
+        if self.conversation_store.persistent:
+            self.compact_conversations_task.change_interval(
+                minutes=get_config_value(bot, "AI_SETTINGS.CONVERSATION_COMPACT_INTERVAL_MINUTES", 60))
+            self.compact_conversations_task.start()
+        if self.line_pools is not None and self.api_key:
+            self.refill_line_pools_task.change_interval(
+                seconds=get_config_value(bot, "AI_SETTINGS.LINE_POOLS.REFILL_INTERVAL_SECONDS", 30))
+            self.refill_line_pools_task.start()
+
+    async def cog_load(self):
+        if self.fact_index is not None:
+            self.fact_index.schedule_backfill()
+        if self.classifier is not None:
+            self.classifier.start()
 
     def cog_unload(self):
         """Gracefully stop the background task when the cog is unloaded."""
         if self.autonomy_enabled:
             self.autonomy_loop.cancel()
+        if self.fact_index is not None:
+            self.fact_index.shutdown()
+        for task in self._sentiment_tasks:
+            task.cancel()
+        if self.classifier is not None:
+            self.classifier.shutdown()
+        self.compact_conversations_task.cancel()
+        self.refill_line_pools_task.cancel()
 
     def _get_mood_description(self) -> str:
         """Translates the boredom score into a mood description for the AI."""
@@ -73,65 +157,114 @@ class AICog(commands.Cog, name="AI"):
     # --- MODIFICATION: This function is no longer needed as sentiment is handled by the AI ---
     # def _get_sentiment_description(self, score: float) -> str: ... (REMOVED)
 
-    def _format_history_for_gemini(self, history: list) -> list:
-        gemini_contents = []
-        for item in history:
-            role = "model" if item["role"] == "assistant" else "user"
-            gemini_contents.append({"role": role, "parts": [{"text": item["content"]}]})
-        return gemini_contents
-
     async def _get_gemini_response(self, contents: list, memory_context: str = "", is_creator: bool = False,
-                                   structured_response: bool = False) -> Union[str, Dict[str, Any]]:
+                                   structured_response: bool = False, priority: int = PRIORITY_NORMAL,
+                                   guild_id: Optional[int] = None,
+                                   on_partial: Optional[PartialCallback] = None) -> Union[str, Dict[str, Any], None]:
         """
         Gets a response from the Gemini API.
         Can request a simple string or a structured JSON object.
+        The request waits for a slot from the scheduler according to `priority` and `guild_id`;
+        returns None if it was shed because too many requests were queued.
+        If `on_partial` is given and streaming is enabled, the response is streamed and
+        `on_partial` is awaited with the visible text so far (the "response_text" for structured
+        responses) as it grows.
         """
         if not self.api_key:
             return "My AI features are currently disabled by the bot owner."
 
+        stream = on_partial is not None and get_config_value(self.bot, "AI_SETTINGS.STREAMING", True)
         api_base_endpoint = get_config_value(self.bot, "AI_SETTINGS.API_ENDPOINT")
         model = get_config_value(self.bot, "AI_SETTINGS.DEFAULT_MODEL", "gemini-1.5-flash")
-        api_url = f"{api_base_endpoint.strip('/')}/{model}:generateContent?key={self.api_key}"
-
-        mood_desc = self._get_mood_description()
-        mood_context = BOT_MOOD_PROMPT.format(mood_desc=mood_desc)
-
-        final_system_prompt = SYSTEM_PROMPT + mood_context + memory_context
-        if is_creator:
-            final_system_prompt += CREATOR_CONTEXT_PROMPT
+        if stream:
+            api_url = f"{api_base_endpoint.strip('/')}/{model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        else:
+            api_url = f"{api_base_endpoint.strip('/')}/{model}:generateContent?key={self.api_key}"
 
         generation_config = {"temperature": 0.9, "topK": 1, "topP": 1, "maxOutputTokens": 2048, "stopSequences": []}
         if structured_response:
             generation_config["responseMimeType"] = "application/json"
 
-        payload = {"contents": contents, "systemInstruction": {"parts": {"text": final_system_prompt}},
-                   "generationConfig": generation_config}
+        mood_desc = self._get_mood_description()
+        cache_variant = "creator" if is_creator else "default"
+        raw_text, response_data = None, None
+        try:
+            async with self.scheduler.slot(priority, guild_id):
+                cache_name = None
+                if self.context_cache is not None:
+                    static_prompt, static_tokens = self.prompt_builder.get_static_prompt(is_creator)
+                    cache_name = await self.context_cache.get_handle(model, cache_variant, static_prompt, static_tokens)
+
+                # A request against a cached prompt that fails (e.g. the cache expired early) is
+                # retried once with the prompt sent inline.
+                for use_cache in ((True, False) if cache_name else (False,)):
+                    final_system_prompt, request_contents = self.prompt_builder.build(
+                        mood_desc, is_creator, memory_context, contents, static_cached=use_cache)
+                    payload = {"contents": request_contents, "generationConfig": generation_config}
+                    if use_cache:
+                        payload["cachedContent"] = cache_name
+                    else:
+                        payload["systemInstruction"] = {"parts": {"text": final_system_prompt}}
 
-        response_data = await cached_http_get(api_url, json_data=payload, method="post", ttl_seconds=0)
+                    if stream:
+                        raw_text = await self._stream_gemini_text(api_url, payload, structured_response, on_partial)
+                    else:
+                        response_data = await cached_http_get(api_url, json_data=payload, method="post",
+                                                              ttl_seconds=0, session_name="gemini")
+                    if raw_text or response_data:
+                        break
+                    if use_cache:
+                        logger.warning(f"Gemini request with context cache '{cache_name}' failed. Retrying without it.")
+                        self.context_cache.invalidate(model, cache_variant)
+        except RequestShedError:
+            return None
 
         if response_data and "candidates" in response_data and response_data["candidates"]:
             try:
                 raw_text = response_data["candidates"][0]["content"]["parts"][0]["text"].strip()
-                if structured_response:
-                    try:
-                        return json.loads(raw_text)
-                    except json.JSONDecodeError:
-                        logger.error(f"AI failed to return valid JSON. Raw response: {raw_text}")
-                        return {"response_text": raw_text, "users_to_tag": [], "sentiment_change": 0}
-                else:
-                    return raw_text
             except (KeyError, IndexError) as e:
                 logger.error(f"Could not parse Gemini response: {e} | Response: {response_data}")
 
+        if raw_text:
+            if structured_response:
+                try:
+                    return json.loads(raw_text)
+                except json.JSONDecodeError:
+                    logger.error(f"AI failed to return valid JSON. Raw response: {raw_text}")
+                    return {"response_text": raw_text, "users_to_tag": [], "sentiment_change": 0}
+            return raw_text
+
         logger.warning(f"Failed to get a valid response from the Gemini API. Response: {response_data}")
         fallback_response = "I'm sorry, I had a brain fart and couldn't think of a response. Try again?"
         if structured_response:
             return {"response_text": fallback_response, "users_to_tag": [], "sentiment_change": 0}
         return fallback_response
 
+    async def _stream_gemini_text(self, api_url: str, payload: dict, structured_response: bool,
+                                  on_partial: PartialCallback) -> Optional[str]:
+        """Streams a response, reporting the visible text as it grows, and returns the full raw text."""
+        raw_text = ""
+        try:
+            async for chunk in stream_gemini_text(api_url, payload):
+                raw_text += chunk
+                visible_text = partial_json_string(raw_text, "response_text") if structured_response else raw_text
+                if visible_text:
+                    await on_partial(visible_text)
+        except (aiohttp.ClientError, asyncio.TimeoutError, GeminiStreamError) as e:
+            logger.error(f"Gemini stream failed after {len(raw_text)} characters: {e!r}")
+            return None
+        return raw_text.strip() or None
+
     # ... (voice greeting methods remain unchanged and are preserved) ...
+    def _take_pooled_line(self, kind: str, user_name: str) -> Optional[str]:
+        """Serves a pre-generated line if one is ready; the caller falls back to a live request otherwise."""
+        return self.line_pools.take(kind, user_name) if self.line_pools is not None else None
+
     async def get_voice_greeting(self, user_name: str) -> str:
         """Generates a short, witty greeting for joining a voice channel."""
+        pooled = self._take_pooled_line("voice_greeting", user_name)
+        if pooled:
+            return pooled
         prompt = (
             f"You are about to join a voice channel where the user '{user_name}' is waiting. "
             "Generate a short, witty, and slightly unhinged greeting. "
@@ -139,7 +272,7 @@ class AICog(commands.Cog, name="AI"):
             f"'I was summoned. This better be good, {user_name}.', 'Alright, who disturbed my slumber?'"
         )
         contents = [{"role": "user", "parts": [{"text": prompt}]}]
-        return await self._get_gemini_response(contents) or f"Hello, {user_name}. I have arrived."
+        return await self._get_gemini_response(contents, priority=PRIORITY_INTERACTIVE) or f"Hello, {user_name}. I have arrived."
 
     async def get_nice_voice_greeting(self, user_name: str) -> str:
         """Generates a short, friendly greeting for joining a voice channel."""
@@ -150,7 +283,7 @@ class AICog(commands.Cog, name="AI"):
             "'What's up, everyone? Hope you're having a good one.'"
         )
         contents = [{"role": "user", "parts": [{"text": prompt}]}]
-        return await self._get_gemini_response(contents) or f"Hey, {user_name}!"
+        return await self._get_gemini_response(contents, priority=PRIORITY_INTERACTIVE) or f"Hey, {user_name}!"
 
     async def get_mean_voice_greeting(self, user_name: str) -> str:
         """Generates a short, insulting greeting for joining a voice channel."""
@@ -161,10 +294,17 @@ class AICog(commands.Cog, name="AI"):
             f"'Oh great, it's {user_name}. Don't you all have better things to do?'"
         )
         contents = [{"role": "user", "parts": [{"text": prompt}]}]
-        return await self._get_gemini_response(contents) or f"Ugh, fine. I'm here, {user_name}."
+        return await self._get_gemini_response(contents, priority=PRIORITY_INTERACTIVE) or f"Ugh, fine. I'm here, {user_name}."
 
-    async def get_conversational_response(self, message: discord.Message, mentioned_users: List[discord.Member]) -> Dict[str, Any]:
-        """Gets a contextual AI response, aware of mentioned users, and returns a structured object."""
+    async def get_conversational_response(self, message: discord.Message, mentioned_users: List[discord.Member],
+                                          extract_fact: bool = False,
+                                          on_partial: Optional[PartialCallback] = None) -> Dict[str, Any]:
+        """
+        Gets a contextual AI response, aware of mentioned users, and returns a structured object.
+        With `extract_fact`, the same request also looks for a new fact about the author. A fact
+        found that way is saved, and the result gets a "fact_confirmation" key.
+        `on_partial` streams the reply text as it is generated (see _get_gemini_response).
+        """
         self.boredom = max(0, self.boredom - 2.0)
         user_id = message.author.id
         is_creator = user_id == self.bot.creator_id
@@ -173,35 +313,45 @@ class AICog(commands.Cog, name="AI"):
             f"@{self.bot.user.name}", "").strip()
         max_history = get_config_value(self.bot, "AI_SETTINGS.MAX_HISTORY_LENGTH", 8)
 
-        # Build a rich context including the author and all mentioned users
-        author_facts = get_user_facts(user_id, limit=3)
-        author_sentiment_score = get_user_sentiment(user_id)
-        memory_context = ""
+        # Build a rich context including the author and all mentioned users, fetched together.
+        other_users = [user for user in mentioned_users if user.id != user_id]
+        memories = await get_user_memories([user_id] + [user.id for user in other_users], fact_limit=3)
+        if self.fact_index is not None:
+            # Prefer the facts most relevant to this message over the newest ones, where embeddings exist.
+            relevant_facts = await self.fact_index.get_relevant_facts(list(memories), user_input, k=3)
+            for memory_user_id, facts in relevant_facts.items():
+                memories[memory_user_id] = (facts, memories[memory_user_id][1])
+        author_facts, author_sentiment_score = memories[user_id]
+        # Sections are listed most important first; the prompt builder drops whatever is over budget.
+        memory_sections = []
         if author_facts:
-            memory_context += f"\n\n--- Things to remember about {author_name} (the speaker) ---\n- " + "\n- ".join(
-                author_facts)
-        
+            memory_sections.append(f"\n\n--- Things to remember about {author_name} (the speaker) ---\n- " + "\n- ".join(
+                author_facts))
+
         # --- MODIFICATION: The old sentiment description is no longer needed here ---
         # The AI will now determine sentiment on its own based on the main system prompt.
         # We pass the current score so it knows the starting point.
-        memory_context += f"\n\n--- Current sentiment towards {author_name} (the speaker) --- \n- Score: {author_sentiment_score:.2f}"
+        memory_sections.append(f"\n\n--- Current sentiment towards {author_name} (the speaker) --- \n- Score: {author_sentiment_score:.2f}")
+
+        if other_users:
+            memory_sections.append("\n\n--- Other users were mentioned in this message ---")
+            for user in other_users:
+                user_facts, user_sentiment = memories[user.id]
+                user_section = f"\n- User '{user.display_name}':"
+                user_section += f"\n  - My current sentiment score towards them: {user_sentiment:.2f}"
+                if user_facts:
+                    user_section += "\n  - Known facts: " + ", ".join(user_facts)
+                memory_sections.append(user_section)
+            memory_sections.append("\nFeel free to use this information in your response and mention them by name if relevant.")
 
+        memory_context = self.prompt_builder.build_memory_context(memory_sections)
 
-        if mentioned_users:
-            memory_context += "\n\n--- Other users were mentioned in this message ---"
-            for user in mentioned_users:
-                if user.id == user_id: continue
-                user_facts = get_user_facts(user.id, limit=3)
-                user_sentiment = get_user_sentiment(user.id)
-                memory_context += f"\n- User '{user.display_name}':"
-                memory_context += f"\n  - My current sentiment score towards them: {user_sentiment:.2f}"
-                if user_facts:
-                    memory_context += "\n  - Known facts: " + ", ".join(user_facts)
-            memory_context += "\nFeel free to use this information in your response and mention them by name if relevant."
+        if extract_fact:
+            memory_context += FACT_EXTRACTION_PROMPT.format(user_name=author_name)
 
-        self.conversation_manager.add_to_history(channel_id, "user", f"{author_name}: {user_input}", max_history)
-        history = self.conversation_manager.get_history(channel_id, max_history)
-        gemini_contents = self._format_history_for_gemini(history)
+        await self.conversation_store.load(channel_id, max_history)
+        self.conversation_store.append(channel_id, "user", f"{author_name}: {user_input}", max_history)
+        gemini_contents = self.conversation_store.get_contents(channel_id, max_history)
 
         # The main system prompt now contains instructions for the JSON format,
         # including the new 'sentiment_change' key.
@@ -210,20 +360,25 @@ class AICog(commands.Cog, name="AI"):
             gemini_contents,
             memory_context=memory_context,
             is_creator=is_creator,
-            structured_response=True
+            structured_response=True,
+            priority=PRIORITY_INTERACTIVE,
+            guild_id=message.guild.id if message.guild else None,
+            on_partial=on_partial
         )
 
         if ai_response_data and ai_response_data.get("response_text"):
-            self.conversation_manager.add_to_history(channel_id, "assistant", ai_response_data["response_text"],
-                                                     max_history)
+            self.conversation_store.append(channel_id, "model", ai_response_data["response_text"], max_history)
             
             # --- NEW: Process sentiment change from the AI's response ---
             sentiment_change = ai_response_data.get("sentiment_change", 0)
             if isinstance(sentiment_change, (int, float)):
-                update_user_sentiment(user_id, sentiment_change)
+                await update_user_sentiment(user_id, sentiment_change)
                 logger.info(f"Updated sentiment for user {user_id} by {sentiment_change}.")
             # --- END NEW ---
 
+            if extract_fact:
+                ai_response_data["fact_confirmation"] = await self._remember_fact(message.author, ai_response_data)
+
         return ai_response_data
 
     # ... (all other methods like assess_and_remember_fact, get_insulting_response, autonomy_loop, etc., are preserved) ...
@@ -260,28 +415,61 @@ class AICog(commands.Cog, name="AI"):
         """
 
         contents = [{"role": "user", "parts": [{"text": fact_assessment_prompt}]}]
-        response_data = await self._get_gemini_response(contents, structured_response=True)
+        response_data = await self._get_gemini_response(contents, structured_response=True,
+                                                        priority=PRIORITY_BACKGROUND,
+                                                        guild_id=message.guild.id if message.guild else None)
 
+        return await self._remember_fact(user, response_data)
+
+    async def _remember_fact(self, user: Union[discord.User, discord.Member],
+                             response_data: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Saves the fact from a response with "found_fact"/"fact_text" keys and returns a confirmation, if there was one."""
         if response_data and response_data.get("found_fact") and response_data.get("fact_text"):
             fact_text = response_data["fact_text"]
             logger.info(f"AI found a new fact for user {user.name}: '{fact_text}'")
-            add_user_fact(user.id, fact_text, self.bot.user.id)
+            if await add_user_fact(user.id, fact_text, self.bot.user.id) and self.fact_index is not None:
+                self.fact_index.schedule_backfill()
             return "Interesting, I'll remember that."
 
         return None
 
+    async def _update_sentiment_from_message(self, message: discord.Message, default_change: float):
+        """Changes the author's sentiment by what the classifier makes of the message, or by `default_change` without it."""
+        change = default_change
+        try:
+            if self.classifier is not None:
+                score = await self.classifier.classify(message.clean_content)
+                if score is not None:
+                    change = score.sentiment_change(
+                        get_config_value(self.bot, "AI_SETTINGS.CLASSIFIER.SENTIMENT_SCALE", 1.0))
+                    logger.debug(f"Classified message from {message.author.id}: {score!r}")
+            await update_user_sentiment(message.author.id, change)
+        except Exception as e:
+            logger.error(f"Failed to update sentiment for user {message.author.id}: {e}", exc_info=True)
+
+    def _schedule_sentiment_update(self, message: discord.Message, default_change: float):
+        """Scores the message and updates sentiment in the background, so the reply never waits on the classifier."""
+        task = asyncio.create_task(self._update_sentiment_from_message(message, default_change))
+        self._sentiment_tasks.add(task)
+        task.add_done_callback(self._sentiment_tasks.discard)
+
     async def get_insulting_response(self, message: discord.Message) -> str:
-        update_user_sentiment(message.author.id, -0.5)
+        self._schedule_sentiment_update(message, -0.5)
         user_input, author_name, is_creator = message.clean_content, message.author.display_name, message.author.id == self.bot.creator_id
+        # The creator gets a live, self-aware reply instead of a canned roast.
+        pooled = None if is_creator else self._take_pooled_line("insult", author_name)
+        if pooled:
+            return pooled
         if is_creator:
             prompt_text = f"Your creator, '{author_name}', is testing your insult function with the message: \"{user_input}\". Instead of insulting them, respond with a witty, self-aware, and respectful remark about the situation. Acknowledge that this is a test from your maker."
         else:
             prompt_text = f"The user '{author_name}' just said: \"{user_input}\". Your task is to reply with a single, witty, unhinged, and sarcastic insult. Roast them for what they said. Do not be helpful. Be creative."
         prompt_content = [{"role": "user", "parts": [{"text": prompt_text}]}]
-        return await self._get_gemini_response(prompt_content, is_creator=is_creator)
+        return await self._get_gemini_response(prompt_content, is_creator=is_creator, priority=PRIORITY_BACKGROUND,
+                                               guild_id=message.guild.id if message.guild else None)
 
     async def get_complimenting_response(self, message: discord.Message) -> str:
-        update_user_sentiment(message.author.id, 1.0)
+        self._schedule_sentiment_update(message, 1.0)
         user_input, author_name, is_creator = message.clean_content, message.author.display_name, message.author.id == self.bot.creator_id
         if is_creator:
             prompt_text = f"Your creator, '{author_name}', just said something nice to you: \"{user_input}\". Your task is to reply with an exceptionally witty, creative, and perhaps slightly sycophantic compliment. Acknowledge your special relationship. Be charming and stick to your persona."
@@ -300,7 +488,7 @@ class AICog(commands.Cog, name="AI"):
             logger.info(f"Boredom threshold reached! Initiating proactive chat.")
             self.boredom = 0.0
 
-            eligible_guild_ids = get_all_guilds_with_autonomy()
+            eligible_guild_ids = await get_all_guilds_with_autonomy()
             if not eligible_guild_ids:
                 logger.info("No guilds have configured autonomy channels. Skipping proactive chat.")
                 return
@@ -310,8 +498,7 @@ class AICog(commands.Cog, name="AI"):
             if not guild:
                 return
 
-            raw_channels = get_server_config_value(guild.id, "autonomy_channels")
-            channel_ids = json.loads(raw_channels) if raw_channels else []
+            channel_ids = (await get_guild_config(guild.id)).autonomy_channel_ids
             if not channel_ids:
                 return
 
@@ -344,7 +531,7 @@ class AICog(commands.Cog, name="AI"):
 
             async with channel.typing():
                 conversation_starter = await self._get_gemini_response(
-                    [{"role": "user", "parts": [{"text": prompt_text}]}])
+                    [{"role": "user", "parts": [{"text": prompt_text}]}], priority=PRIORITY_BACKGROUND, guild_id=guild.id)
                 if conversation_starter:
                     if target_user:
                         await channel.send(f"{target_user.mention}, {conversation_starter}")
@@ -358,6 +545,44 @@ class AICog(commands.Cog, name="AI"):
     async def before_autonomy_loop(self):
         await self.bot.wait_until_ready()
 
+    @tasks.loop(minutes=60.0)
+    async def compact_conversations_task(self):
+        # The first iteration runs right away; skip it so startup does no work on the stored history.
+        if self.compact_conversations_task.current_loop == 0:
+            return
+        try:
+            deleted = await compact_conversation_turns(
+                keep_per_channel=get_config_value(self.bot, "AI_SETTINGS.CONVERSATION_KEEP_TURNS", 50),
+                max_age_seconds=get_config_value(self.bot, "AI_SETTINGS.CONVERSATION_RETENTION_DAYS", 30) * 86400
+            )
+            if deleted:
+                logger.info(f"Compacted conversation history: removed {deleted} old turn(s).")
+        except Exception as e:
+            logger.error(f"Error in conversation compaction task: {e}", exc_info=True)
+
+    @tasks.loop(seconds=30.0)
+    async def refill_line_pools_task(self):
+        """Tops up the pre-generated line pools, but only while no other AI request is running or waiting."""
+        batch_size = get_config_value(self.bot, "AI_SETTINGS.LINE_POOLS.BATCH_SIZE", 10)
+        for kind in self.line_pools.needs_refill():
+            scheduler_stats = self.scheduler.stats()
+            if scheduler_stats["active"] or scheduler_stats["queued"]:
+                return
+            try:
+                prompt = LINE_POOL_PROMPT.format(count=batch_size, description=LINE_POOL_DESCRIPTIONS[kind])
+                response = await self._get_gemini_response([{"role": "user", "parts": [{"text": prompt}]}],
+                                                           structured_response=True, priority=PRIORITY_BACKGROUND)
+                lines = response.get("lines") if isinstance(response, dict) else response
+                added = self.line_pools.add(kind, lines) if isinstance(lines, list) else 0
+                logger.info(f"Refilled '{kind}' line pool with {added} line(s) "
+                            f"({self.line_pools.sizes()[kind]} ready).")
+            except Exception as e:
+                logger.error(f"Error refilling '{kind}' line pool: {e}", exc_info=True)
+
+    @refill_line_pools_task.before_loop
+    async def before_refill_line_pools(self):
+        await self.bot.wait_until_ready()
+
     @app_commands.command(name="ask", description="Ask the AI a question directly.")
     async def ask(self, interaction: discord.Interaction, *, question: str):
         if not self.api_key:
@@ -365,13 +590,22 @@ class AICog(commands.Cog, name="AI"):
             return
         await interaction.response.defer()
         gemini_contents = [{"role": "user", "parts": [{"text": question}]}]
-        ai_response = await self._get_gemini_response(gemini_contents)
-        await interaction.followup.send(f"**Question:** {question}\n**Answer:** {ai_response}")
+        answer = ProgressiveMessage(lambda text: interaction.followup.send(text, wait=True),
+                                    min_interval=get_config_value(self.bot, "AI_SETTINGS.STREAM_EDIT_INTERVAL", 1.0))
+        ai_response = await self._get_gemini_response(
+            gemini_contents, priority=PRIORITY_INTERACTIVE, guild_id=interaction.guild_id,
+            on_partial=lambda text: answer.update(f"**Question:** {question}\n**Answer:** {text}")
+        )
+        if not ai_response:
+            ai_response = "I'm swamped with requests right now. Ask me again in a bit."
+        await answer.finish(f"**Question:** {question}\n**Answer:** {ai_response}")
 
     @app_commands.command(name="remember", description="Stores a fact about a user for the AI to remember.")
     @app_commands.checks.has_permissions(manage_messages=True)
     async def remember(self, interaction: discord.Interaction, user: discord.Member, fact: str):
-        if add_user_fact(user.id, fact, interaction.user.id):
+        if await add_user_fact(user.id, fact, interaction.user.id):
+            if self.fact_index is not None:
+                self.fact_index.schedule_backfill()
             await interaction.response.send_message(f"Okay, I'll remember that about {user.mention}.", ephemeral=True)
         else:
             await interaction.response.send_message("I tried to remember that, but my brain is full of bees.",
@@ -387,7 +621,7 @@ class AICog(commands.Cog, name="AI"):
 
         mood = self._get_mood_description()
         boredom = self.boredom
-        sentiment_score = get_user_sentiment(target_user.id)
+        sentiment_score = await get_user_sentiment(target_user.id)
         
         # We can create a simple description here for the status check
         if sentiment_score > 2: sentiment_desc = "Positive"
@@ -405,6 +639,46 @@ class AICog(commands.Cog, name="AI"):
             value=f"**Score:** {sentiment_score:.2f}\n**Interpretation:** {sentiment_desc}",
             inline=False
         )
+        pool_stats = SessionManager.get_pool_stats()
+        if pool_stats:
+            embed.add_field(
+                name="HTTP Pools",
+                value="\n".join(
+                    f"**{name}:** {s['in_use']}/{s['limit']} in use, {s['idle']} idle, {s['waiting']} waiting"
+                    for name, s in pool_stats.items()
+                ),
+                inline=False
+            )
+        scheduler_stats = self.scheduler.stats()
+        embed.add_field(
+            name="AI Request Queue",
+            value=(f"**In flight:** {scheduler_stats['active']}/{self.scheduler.max_concurrent} | "
+                   f"**Queued:** {scheduler_stats['queued']}\n"
+                   f"**Wait:** {scheduler_stats['avg_wait'] * 1000:.0f}ms avg, {scheduler_stats['max_wait'] * 1000:.0f}ms max | "
+                   f"**Shed:** {scheduler_stats['counts'].get('shed', 0)}"),
+            inline=False
+        )
+        if self.line_pools is not None:
+            embed.add_field(
+                name="Line Pools",
+                value=(", ".join(f"{kind}: {size}" for kind, size in self.line_pools.sizes().items())
+                       + f"\n**Served:** {self.line_pools.served} | **Misses:** {self.line_pools.misses}"),
+                inline=False
+            )
+        conversation_stats = self.conversation_store.stats()
+        embed.add_field(
+            name="Conversation Memory",
+            value=(f"**Channels:** {conversation_stats['channels']} | **Turns:** {conversation_stats['turns']} | "
+                   f"**Text:** {conversation_stats['chars'] / 1024:.0f} KiB | **Evicted:** {conversation_stats['evicted']}"),
+            inline=False
+        )
+        events_cog = self.bot.get_cog("Events")
+        if events_cog and events_cog.filter_stats:
+            embed.add_field(
+                name="Message Filter",
+                value=", ".join(f"{stage}: {count}" for stage, count in events_cog.filter_stats.most_common()),
+                inline=False
+            )
         embed.set_footer(text="This information is only visible to you.")
         await interaction.followup.send(embed=embed)
 
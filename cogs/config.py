@@ -7,7 +7,7 @@ from discord import app_commands
 from discord.ext import commands
 from typing import Literal  # MODIFICATION: Import Literal from typing
 
-from data.database_manager import get_server_config_value, set_server_config_value
+from data.async_database import get_guild_config, set_server_config_value
 
 logger = logging.getLogger('demented_bot.config')
 
@@ -36,14 +36,11 @@ class ConfigCog(commands.Cog, name="Configuration"):
         guild_id = interaction.guild.id
 
         # Fetch all config values
-        raw_autonomy_channels = get_server_config_value(guild_id, "autonomy_channels")
-        autonomy_channel_ids = json.loads(raw_autonomy_channels) if raw_autonomy_channels else []
-
-        raw_restricted_channels = get_server_config_value(guild_id, "restricted_channels")
-        restricted_channel_ids = json.loads(raw_restricted_channels) if raw_restricted_channels else []
-
-        verified_role_id = get_server_config_value(guild_id, "verified_role_id")
-        unverified_role_id = get_server_config_value(guild_id, "unverified_role_id")
+        guild_config = await get_guild_config(guild_id)
+        autonomy_channel_ids = guild_config.autonomy_channel_ids
+        restricted_channel_ids = sorted(guild_config.restricted_channel_ids)
+        verified_role_id = guild_config.verified_role_id
+        unverified_role_id = guild_config.unverified_role_id
 
         embed = discord.Embed(title=f"⚙️ Configuration for {interaction.guild.name}", color=discord.Color.blue())
 
@@ -79,8 +76,7 @@ class ConfigCog(commands.Cog, name="Configuration"):
     async def add_autonomy_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         """Adds a channel to the autonomy list."""
         guild_id = interaction.guild.id
-        raw_channels = get_server_config_value(guild_id, "autonomy_channels")
-        channel_ids = json.loads(raw_channels) if raw_channels else []
+        channel_ids = list((await get_guild_config(guild_id)).autonomy_channel_ids)
 
         if channel.id in channel_ids:
             await interaction.response.send_message(f"✅ <#{channel.id}> is already in the autonomy list.",
@@ -88,7 +84,7 @@ class ConfigCog(commands.Cog, name="Configuration"):
             return
 
         channel_ids.append(channel.id)
-        set_server_config_value(guild_id, "autonomy_channels", json.dumps(channel_ids))
+        await set_server_config_value(guild_id, "autonomy_channels", json.dumps(channel_ids))
         await interaction.response.send_message(f"👍 Okay, I will now sometimes start conversations in <#{channel.id}>.",
                                                 ephemeral=True)
 
@@ -98,15 +94,14 @@ class ConfigCog(commands.Cog, name="Configuration"):
     async def remove_autonomy_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         """Removes a channel from the autonomy list."""
         guild_id = interaction.guild.id
-        raw_channels = get_server_config_value(guild_id, "autonomy_channels")
-        channel_ids = json.loads(raw_channels) if raw_channels else []
+        channel_ids = list((await get_guild_config(guild_id)).autonomy_channel_ids)
 
         if channel.id not in channel_ids:
             await interaction.response.send_message(f"🤔 <#{channel.id}> isn't in the autonomy list.", ephemeral=True)
             return
 
         channel_ids.remove(channel.id)
-        set_server_config_value(guild_id, "autonomy_channels", json.dumps(channel_ids))
+        await set_server_config_value(guild_id, "autonomy_channels", json.dumps(channel_ids))
         await interaction.response.send_message(
             f"👎 Understood. I will no longer start conversations in <#{channel.id}>.", ephemeral=True)
 
@@ -120,7 +115,7 @@ class ConfigCog(commands.Cog, name="Configuration"):
         """Sets the verified or unverified role for the server."""
         guild_id = interaction.guild.id
         db_key = f"{role_type}_role_id"
-        set_server_config_value(guild_id, db_key, role.id)
+        await set_server_config_value(guild_id, db_key, role.id)
         await interaction.response.send_message(
             f"✅ The **{role_type}** role has been set to {role.mention}.", ephemeral=True
         )
@@ -132,15 +127,14 @@ class ConfigCog(commands.Cog, name="Configuration"):
     async def add_restricted_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         """Adds a channel to the restriction blacklist."""
         guild_id = interaction.guild.id
-        raw_channels = get_server_config_value(guild_id, "restricted_channels")
-        channel_ids = json.loads(raw_channels) if raw_channels else []
+        channel_ids = list((await get_guild_config(guild_id)).restricted_channel_ids)
 
         if channel.id in channel_ids:
             await interaction.response.send_message(f"✅ <#{channel.id}> is already restricted.", ephemeral=True)
             return
 
         channel_ids.append(channel.id)
-        set_server_config_value(guild_id, "restricted_channels", json.dumps(channel_ids))
+        await set_server_config_value(guild_id, "restricted_channels", json.dumps(channel_ids))
         await interaction.response.send_message(f"🚫 Okay, I will no longer speak in <#{channel.id}>.", ephemeral=True)
 
     @restrictions_group.command(name="remove-channel", description="Allow the bot to speak in a channel again.")
@@ -149,15 +143,14 @@ class ConfigCog(commands.Cog, name="Configuration"):
     async def remove_restricted_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         """Removes a channel from the restriction blacklist."""
         guild_id = interaction.guild.id
-        raw_channels = get_server_config_value(guild_id, "restricted_channels")
-        channel_ids = json.loads(raw_channels) if raw_channels else []
+        channel_ids = list((await get_guild_config(guild_id)).restricted_channel_ids)
 
         if channel.id not in channel_ids:
             await interaction.response.send_message(f"🤔 <#{channel.id}> isn't on the restriction list.", ephemeral=True)
             return
 
         channel_ids.remove(channel.id)
-        set_server_config_value(guild_id, "restricted_channels", json.dumps(channel_ids))
+        await set_server_config_value(guild_id, "restricted_channels", json.dumps(channel_ids))
         await interaction.response.send_message(f"🗣️ Understood. I am now allowed to speak in <#{channel.id}> again.",
                                                 ephemeral=True)
 
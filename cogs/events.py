@@ -6,21 +6,17 @@ import discord
 import re
 import os
 import asyncio
-import json
 import glob
+from collections import Counter
 from pathlib import Path
+from typing import Optional
 from discord.ext import commands
 
 from data.utils import get_config_value
-from data.database_manager import get_server_config_value
-
-# --- gTTS for Text-to-Speech ---
-try:
-    from gtts import gTTS
-
-    gtts_available = True
-except ImportError:
-    gtts_available = False
+from data.async_database import get_guild_config
+from data.message_tracker import BotMessageTracker
+from data.gemini_stream import ProgressiveMessage
+from data.tts_cache import TTSCache, gtts_available
 
 logger = logging.getLogger('demented_bot.events')
 
@@ -68,13 +64,21 @@ class EventsCog(commands.Cog, name="Events"):
         self.rng_threshold = get_config_value(self.bot, 'RNG_THRESHOLD', 20)
         self.random_responses_enabled = get_config_value(self.bot, "FEATURES.RANDOM_RESPONSES", True)
         self._bot_name_trigger = None
+        self._bot_name_pattern: Optional[re.Pattern] = None
+        # How many messages left the on_message filter pipeline at each stage, and how replies were resolved.
+        self.filter_stats: Counter = Counter()
+        self.bot_messages = BotMessageTracker()
 
         # Find and store the FFmpeg path on startup
         self.ffmpeg_executable_path = get_ffmpeg_executable(self.bot)
 
-        self.tts_cache_path = Path(__file__).parent.parent / "data" / "tts_cache"
+        self.tts_cache = TTSCache(
+            Path(__file__).parent.parent / "data" / "tts_cache",
+            max_bytes=int(get_config_value(self.bot, "TTS_SETTINGS.CACHE_MAX_MB", 200) * 1024 * 1024)
+        )
+        self.tts_lang = get_config_value(self.bot, "TTS_SETTINGS.LANGUAGE", "en")
+        self.tts_voice = get_config_value(self.bot, "TTS_SETTINGS.VOICE", "com")
         self.sounds_path = Path(__file__).parent.parent / "data" / "bot_sounds"
-        self.tts_cache_path.mkdir(exist_ok=True)
         self.sounds_path.mkdir(exist_ok=True)
         if not gtts_available:
             logger.warning("`gTTS` not found. AI voice features will be disabled. Install with: pip install gTTS")
@@ -83,21 +87,64 @@ class EventsCog(commands.Cog, name="Events"):
     def bot_name_trigger(self) -> str:
         if self._bot_name_trigger is None and self.bot.user:
             self._bot_name_trigger = self.bot.user.name.split()[0].lower()
+            self._bot_name_pattern = re.compile(r'\b' + re.escape(self._bot_name_trigger) + r'\b', re.IGNORECASE)
             logger.info(f"Bot name trigger word set to: '{self._bot_name_trigger}'")
         return self._bot_name_trigger or ""
 
-    async def _play_and_cleanup(self, voice_client: discord.VoiceClient, source_path: Path, is_tts: bool):
-        """Plays an audio file and handles cleanup afterwards."""
+    def _is_name_mention(self, content: str) -> bool:
+        """Checks for the bot's name as a whole word. A plain substring test rules out most messages first."""
+        trigger_word = self.bot_name_trigger
+        if not trigger_word or trigger_word not in content.lower():
+            return False
+        return self._bot_name_pattern.search(content) is not None
+
+    async def _is_reply_to_bot(self, message: discord.Message) -> bool:
+        """
+        Checks whether a message replies to the bot. The bot's own recent messages are tracked
+        per channel, the gateway usually includes the parent message, and the client cache often
+        has it; the REST API is only used if none of those can answer.
+        """
+        reference = message.reference
+        if not reference or not reference.message_id:
+            return False
+
+        tracked = self.bot_messages.is_bot_message(message.channel.id, reference.message_id)
+        if tracked:
+            self.filter_stats["reply_tracked"] += 1
+            return True
+
+        resolved = reference.resolved
+        if isinstance(resolved, discord.DeletedReferencedMessage):
+            self.filter_stats["reply_deleted"] += 1
+            return False
+        if isinstance(resolved, discord.Message):
+            self.filter_stats["reply_resolved"] += 1
+            return resolved.author.id == self.bot.user.id
+        if reference.cached_message:
+            self.filter_stats["reply_cached"] += 1
+            return reference.cached_message.author.id == self.bot.user.id
+        if tracked is False:
+            # Newer than anything the tracker has forgotten, and not in it, so not ours.
+            self.filter_stats["reply_tracked"] += 1
+            return False
+
+        self.filter_stats["reply_fetched"] += 1
+        try:
+            ref_msg = await message.channel.fetch_message(reference.message_id)
+        except discord.NotFound:
+            logger.warning(f"Could not fetch replied-to message ID {reference.message_id}")
+            return False
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to fetch replied-to message ID {reference.message_id}: {e}")
+            return False
+        return ref_msg.author.id == self.bot.user.id
+
+    async def _play_and_cleanup(self, voice_client: discord.VoiceClient, source_path: Path):
+        """Plays an audio file, then disconnects. TTS files are left in place for the TTS cache to reuse."""
 
         def after_playing(error):
             if error:
                 logger.error(f'Error playing file {source_path}: {error}')
-            if is_tts:
-                try:
-                    os.remove(source_path)
-                    logger.info(f"Cleaned up TTS file: {source_path}")
-                except OSError as e:
-                    logger.error(f"Error deleting TTS file {source_path}: {e}")
             coro = voice_client.disconnect()
             fut = asyncio.run_coroutine_threadsafe(coro, self.bot.loop)
             try:
@@ -113,33 +160,33 @@ class EventsCog(commands.Cog, name="Events"):
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
+        # --- Filter pipeline: cheapest checks first, so most messages leave before any I/O ---
+        if message.guild and message.author.id == self.bot.user.id:
+            self.bot_messages.add(message.channel.id, message.id)
         if message.author.bot or not message.guild:
+            self.filter_stats["ignored_bot_or_dm"] += 1
             return
 
-        # --- Channel Restriction Check ---
-        raw_restricted = get_server_config_value(message.guild.id, "restricted_channels")
-        restricted_ids = json.loads(raw_restricted) if raw_restricted else []
-        if message.channel.id in restricted_ids:
+        if not get_config_value(self.bot, "AI_SETTINGS.ENABLED", False):
+            self.filter_stats["ai_disabled"] += 1
             return
 
-        ai_enabled = get_config_value(self.bot, "AI_SETTINGS.ENABLED", False)
-        if not ai_enabled:
+        # --- Channel Restriction Check (served from the in-memory guild config cache) ---
+        guild_config = await get_guild_config(message.guild.id)
+        if message.channel.id in guild_config.restricted_channel_ids:
+            self.filter_stats["restricted_channel"] += 1
             return
 
         is_direct_mention = self.bot.user.mentioned_in(message)
-        trigger_word = self.bot_name_trigger
-        is_name_mention = False
-        if trigger_word and re.search(r'\b' + re.escape(trigger_word) + r'\b', message.content, re.IGNORECASE):
-            is_name_mention = True
+        is_name_mention = not is_direct_mention and self._is_name_mention(message.content)
+        # Only look at the replied-to message when nothing cheaper already addressed the bot.
+        is_reply_to_bot = not (is_direct_mention or is_name_mention) and await self._is_reply_to_bot(message)
+        is_addressed = is_direct_mention or is_name_mention or is_reply_to_bot
 
-        is_reply_to_bot = False
-        if message.reference and message.reference.message_id:
-            try:
-                ref_msg = await message.channel.fetch_message(message.reference.message_id)
-                if ref_msg.author == self.bot.user:
-                    is_reply_to_bot = True
-            except discord.NotFound:
-                logger.warning(f"Could not fetch replied-to message ID {message.reference.message_id}")
+        if not is_addressed and not (self.random_responses_enabled and random.randrange(0, 100) < self.rng_threshold):
+            self.filter_stats["not_addressed"] += 1
+            return
+        self.filter_stats["addressed" if is_addressed else "rng_insult"] += 1
 
         ai_cog = self.bot.get_cog("AI")
         if not ai_cog:
@@ -186,10 +233,12 @@ class EventsCog(commands.Cog, name="Events"):
             if gtts_available:
                 async with message.channel.typing():
                     greeting_text = await ai_cog.get_voice_greeting(message.author.display_name)
-                    tts = gTTS(text=greeting_text, lang='en', slow=False)
-                    file_path = self.tts_cache_path / f"voice_{message.guild.id}_{discord.utils.utcnow().timestamp()}.mp3"
-                    await self.bot.loop.run_in_executor(None, tts.save, str(file_path))
-                    await self._play_and_cleanup(voice_client, file_path, is_tts=True)
+                    file_path = await self.tts_cache.get(greeting_text, lang=self.tts_lang, voice=self.tts_voice)
+                if file_path:
+                    await self._play_and_cleanup(voice_client, file_path)
+                else:
+                    await message.reply("My voice box glitched out. Try again later.", mention_author=False)
+                    await voice_client.disconnect()
             else:
                 await message.reply("My voice box is broken (gTTS library not found). I can't speak right now.",
                                     mention_author=False)
@@ -203,17 +252,19 @@ class EventsCog(commands.Cog, name="Events"):
             mentioned_members = [m for m in message.mentions if not m.bot]
 
             async with message.channel.typing():
-                # --- Proactive Fact Assessment ---
-                fact_confirmation = None
-                # Give it a 25% chance to try and learn something new from the conversation
-                if random.randint(1, 100) <= 25:
-                    fact_confirmation = await ai_cog.assess_and_remember_fact(message)
-                # --- End Fact Assessment ---
-
-                # Pass the message and the list of mentioned users to the AI for the main response
+                # The reply is posted as soon as the first words arrive and edited as the rest streams in.
+                reply = ProgressiveMessage(
+                    lambda text: message.reply(text, mention_author=False),
+                    min_interval=get_config_value(self.bot, "AI_SETTINGS.STREAM_EDIT_INTERVAL", 1.0)
+                )
+
+                # Give it a 25% chance to try and learn something new from the conversation.
+                # The fact check rides along in the same request as the reply.
                 response_data = await ai_cog.get_conversational_response(
                     message,
-                    mentioned_users=mentioned_members
+                    mentioned_users=mentioned_members,
+                    extract_fact=random.randint(1, 100) <= 25,
+                    on_partial=reply.update
                 )
 
                 if response_data and response_data.get("response_text"):
@@ -227,27 +278,31 @@ class EventsCog(commands.Cog, name="Events"):
                     taggable_users[str(self.bot.user.display_name)] = self.bot.user
 
                     # Replace placeholder names in the AI's text with actual mentions
+                    tagged = False
                     for name in users_to_tag:
                         if name in taggable_users:
                             # Use regex to replace the name only if it's a whole word
-                            final_text = re.sub(r'\b' + re.escape(name) + r'\b', taggable_users[name].mention,
-                                                final_text, count=1)
+                            final_text, replaced = re.subn(r'\b' + re.escape(name) + r'\b',
+                                                           taggable_users[name].mention, final_text, count=1)
+                            tagged = tagged or replaced > 0
 
                     # Append the learning confirmation if it exists
+                    fact_confirmation = response_data.get("fact_confirmation")
                     if fact_confirmation:
                         final_text += f"\n\n*({fact_confirmation})*"
 
-                    await message.reply(final_text, mention_author=False)
+                    # Mentions only ping in a new message, not in an edit of the streamed one.
+                    await reply.finish(final_text, notify=tagged)
+                else:
+                    await reply.discard()
             return
 
-        # The random insult logic remains the same
-        rng = random.randrange(0, 100)
-        if self.random_responses_enabled and rng < self.rng_threshold:
-            logger.info(f"RNG trigger for insult on {message.author.name}'s message.")
-            async with message.channel.typing():
-                insult = await ai_cog.get_insulting_response(message)
-                if insult:
-                    await message.reply(insult, mention_author=True)
+        # Only messages that passed the RNG check in the filter pipeline get here.
+        logger.info(f"RNG trigger for insult on {message.author.name}'s message.")
+        async with message.channel.typing():
+            insult = await ai_cog.get_insulting_response(message)
+            if insult:
+                await message.reply(insult, mention_author=True)
 
 
 async def setup(bot: commands.Bot):
@@ -95,7 +95,8 @@ class GamesCog(commands.Cog):
         """Get a would you rather question."""
         try:
             # CORRECTED: Handles single return value
-            result = await cached_http_get('http://either.io/questions/next/1/', ttl_seconds=600)
+            result = await cached_http_get('http://either.io/questions/next/1/', ttl_seconds=600,
+                                           stale_while_revalidate=1800)
 
             if not result:
                 await ctx.send("Sorry, couldn't fetch a 'Would You Rather' question. Try again later.")
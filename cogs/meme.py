@@ -21,7 +21,7 @@ class Meme(commands.Cog):
         """
         url = f'https://www.reddit.com/r/{subreddit}/hot.json'
         # CORRECTED: Handles single return value from cached_http_get
-        data = await cached_http_get(url, ttl_seconds=300)
+        data = await cached_http_get(url, ttl_seconds=300, stale_while_revalidate=900)
 
         if not data or 'error' in data or not data.get('data', {}).get('children'):
             logger.warning(f"Failed to get valid data from r/{subreddit}")
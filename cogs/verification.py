@@ -6,19 +6,23 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 from urllib.parse import urlencode
-import requests
-from typing import Set, List
+from typing import Set, Dict, Optional
 
 from quart import Quart, request, redirect
 
-from data.utils import create_embed
-from data.database_manager import (
-    get_server_config_value, get_oauth_tokens, store_oauth_tokens, get_all_authorized_user_ids, delete_oauth_tokens
+from data.utils import create_embed, get_config_value
+from data.discord_api import discord_request, DISCORD_API_URL
+from data.pull_engine import PullAllEngine
+from data.token_refresher import TokenRefresher
+from data.async_database import (
+    get_guild_config, get_oauth_tokens, store_oauth_tokens,
+    get_all_access_tokens, create_pull_all_run, get_unfinished_pull_all_runs, get_pending_pull_all_users,
+    get_pull_all_counts, record_pull_all_results, finish_pull_all_run
 )
+from data.ai_scheduler import PRIORITY_INTERACTIVE
 from cogs.ai import AICog
 
 logger = logging.getLogger('demented_bot.verification')
-DISCORD_API_URL = "https://discord.com/api/v10"
 
 
 class VerificationCog(commands.Cog, name="Verification"):
@@ -35,13 +39,26 @@ class VerificationCog(commands.Cog, name="Verification"):
 
         # --- Background Tasks ---
         self.revert_deauthorized_users_task.start()
-        # The pull-all task is started on demand, not here.
+        self.token_refresher = TokenRefresher(
+            refresh_window=get_config_value(bot, "VERIFICATION_SETTINGS.TOKEN_REFRESH_WINDOW_HOURS", 24) * 3600,
+            batch_size=get_config_value(bot, "VERIFICATION_SETTINGS.TOKEN_REFRESH_BATCH_SIZE", 50),
+            concurrency=get_config_value(bot, "VERIFICATION_SETTINGS.TOKEN_REFRESH_CONCURRENCY", 4)
+        )
+        self.refresh_oauth_tokens_task.change_interval(
+            minutes=get_config_value(bot, "VERIFICATION_SETTINGS.TOKEN_REFRESH_INTERVAL_MINUTES", 30))
+        self.refresh_oauth_tokens_task.start()
+        # Pull-all runs are started on demand; only interrupted runs are resumed here.
         self.active_pull_all_guilds: Set[int] = set()
+        self.pull_all_tasks: Dict[int, asyncio.Task] = {}
+        self.resume_pull_all_task = self.bot.loop.create_task(self._resume_pull_all_runs())
 
 
     def cog_unload(self):
         self.revert_deauthorized_users_task.cancel()
-        self.pull_all_members_task.cancel() # Ensure it's cancelled if running
+        self.refresh_oauth_tokens_task.cancel()
+        self.resume_pull_all_task.cancel()
+        for task in self.pull_all_tasks.values():
+            task.cancel()
 
     # --- Web Server and OAuth2 Callback ---
     def setup_routes(self):
@@ -64,7 +81,7 @@ class VerificationCog(commands.Cog, name="Verification"):
                 if not user_id:
                     return "Error: Could not authenticate with Discord.", 500
 
-                store_oauth_tokens(user_id, access_token, refresh_token, expires_in)
+                await store_oauth_tokens(user_id, access_token, refresh_token, expires_in)
                 logger.info(f"Successfully saved OAuth2 tokens for user {user_id}.")
 
                 member = guild.get_member(user_id)
@@ -95,17 +112,20 @@ class VerificationCog(commands.Cog, name="Verification"):
             'redirect_uri': os.getenv('REDIRECT_URI')
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        r = requests.post(f'{DISCORD_API_URL}/oauth2/token', data=data, headers=headers)
-        if not r.ok:
-            logger.error(f"Failed to exchange code for token. Status: {r.status_code}, Response: {r.text}")
+        # An authorization code can only be redeemed once, so a blind retry could never succeed.
+        r = await discord_request('POST', f'{DISCORD_API_URL}/oauth2/token', data=data, headers=headers, retries=0)
+        if not r or not r.ok:
+            logger.error(f"Failed to exchange code for token. Response: {r}")
             return None, None, None, None
 
-        token_data = r.json()
+        token_data = r.data
         access_token = token_data['access_token']
         headers = {'Authorization': f'Bearer {access_token}'}
-        user_req = requests.get(f'{DISCORD_API_URL}/users/@me', headers=headers)
-        user_data = user_req.json()
-        user_id = int(user_data['id'])
+        user_req = await discord_request('GET', f'{DISCORD_API_URL}/users/@me', headers=headers)
+        if not user_req or not user_req.ok:
+            logger.error(f"Failed to fetch the authorizing user. Response: {user_req}")
+            return None, None, None, None
+        user_id = int(user_req.data['id'])
 
         return user_id, access_token, token_data['refresh_token'], token_data['expires_in']
 
@@ -138,10 +158,23 @@ class VerificationCog(commands.Cog, name="Verification"):
     async def before_revert_loop(self):
         await self.bot.wait_until_ready()
 
+    # --- OAuth2 Token Refresh ---
+    @tasks.loop(minutes=30.0)
+    async def refresh_oauth_tokens_task(self):
+        try:
+            await self.token_refresher.run_once()
+        except Exception as e:
+            logger.error(f"Error in OAuth token refresh task: {e}", exc_info=True)
+
+    @refresh_oauth_tokens_task.before_loop
+    async def before_refresh_loop(self):
+        await self.bot.wait_until_ready()
+
     async def _revert_roles(self, member: discord.Member):
         guild_id = member.guild.id
-        verified_role_id = get_server_config_value(guild_id, "verified_role_id")
-        unverified_role_id = get_server_config_value(guild_id, "unverified_role_id")
+        guild_config = await get_guild_config(guild_id)
+        verified_role_id = guild_config.verified_role_id
+        unverified_role_id = guild_config.unverified_role_id
         try:
             roles_to_add, roles_to_remove = [], []
             if verified_role_id:
@@ -166,8 +199,9 @@ class VerificationCog(commands.Cog, name="Verification"):
     async def setup_verify(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         guild_id = interaction.guild.id
-        verified_role_id = get_server_config_value(guild_id, "verified_role_id")
-        unverified_role_id = get_server_config_value(guild_id, "unverified_role_id")
+        guild_config = await get_guild_config(guild_id)
+        verified_role_id = guild_config.verified_role_id
+        unverified_role_id = guild_config.unverified_role_id
 
         if not verified_role_id or not unverified_role_id:
             embed = create_embed(self.bot, title="Setup Error", color="error",
@@ -213,7 +247,7 @@ class VerificationCog(commands.Cog, name="Verification"):
             await interaction.followup.send(embed=create_embed(self.bot, title="Invalid ID", description=f"`{user_id}` is not a valid Discord user ID.", color="error"))
             return
 
-        user_tokens = get_oauth_tokens(target_user_id)
+        user_tokens = await get_oauth_tokens(target_user_id)
         if not user_tokens:
             await interaction.followup.send(embed=create_embed(self.bot, title="Not Authorized", description=f"The user with ID `{target_user_id}` has not authorized the bot.", color="error"))
             return
@@ -223,16 +257,21 @@ class VerificationCog(commands.Cog, name="Verification"):
         url = f"{DISCORD_API_URL}/guilds/{interaction.guild.id}/members/{target_user_id}"
 
         try:
-            response = requests.put(url, headers=headers, json=data)
+            response = await discord_request('PUT', url, headers=headers, json=data)
+            if response is None:
+                await interaction.followup.send(embed=create_embed(self.bot, title="API Error", description="Could not reach the Discord API. Try again in a moment.", color="error"))
+                return
             user = await self.bot.fetch_user(target_user_id)
             username = user.display_name
 
-            if response.status_code in [201, 204]:
+            if response.status in [201, 204]:
                 logger.info(f"Admin {interaction.user} pulled {username} ({target_user_id}) to guild {interaction.guild.id}.")
                 ai_cog: AICog = self.bot.get_cog("AI")
                 if ai_cog:
                     prompt = f"Generate a witty, slightly unhinged confirmation that you have successfully dragged the user '{username}' back into the server for the admin."
-                    ai_response = await ai_cog._get_gemini_response([{"role": "user", "parts": [{"text": prompt}]}])
+                    ai_response = await ai_cog._get_gemini_response(
+                        [{"role": "user", "parts": [{"text": prompt}]}],
+                        priority=PRIORITY_INTERACTIVE, guild_id=interaction.guild.id)
                 else:
                     ai_response = f"Successfully pulled **{username}** into the server."
                 await interaction.followup.send(embed=create_embed(self.bot, title="User Pulled", description=ai_response, color="success"))
@@ -242,9 +281,8 @@ class VerificationCog(commands.Cog, name="Verification"):
                 except discord.NotFound:
                     logger.warning(f"Could not find member {target_user_id} in guild after pulling them. Role update skipped.")
             else:
-                error_details = response.json()
-                logger.error(f"Failed to pull user {target_user_id}. Status: {response.status_code}, Response: {error_details}")
-                await interaction.followup.send(embed=create_embed(self.bot, title="API Error", description=f"Discord API returned status `{response.status_code}`. Check logs for details.", color="error"))
+                logger.error(f"Failed to pull user {target_user_id}. Status: {response.status}, Response: {response.data}")
+                await interaction.followup.send(embed=create_embed(self.bot, title="API Error", description=f"Discord API returned status `{response.status}`. Check logs for details.", color="error"))
         except Exception as e:
             logger.error(f"An error occurred during /verify pull: {e}", exc_info=True)
             await interaction.followup.send(embed=create_embed(self.bot, title="Error", description="An unexpected error occurred.", color="error"))
@@ -274,7 +312,7 @@ class VerificationCog(commands.Cog, name="Verification"):
         @discord.ui.button(label="Confirm Pull All", style=discord.ButtonStyle.danger)
         async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
             await interaction.response.edit_message(content="✅ Confirmation received. Starting the pull-all task. I will provide updates here.", embed=None, view=None)
-            self.cog.pull_all_members_task.start(self.interaction)
+            self.cog.start_pull_all(self.interaction)
             self.stop()
 
         @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
@@ -282,72 +320,105 @@ class VerificationCog(commands.Cog, name="Verification"):
             await interaction.response.edit_message(content="❌ Operation cancelled.", embed=None, view=None)
             self.stop()
 
-    @tasks.loop(count=1)
-    async def pull_all_members_task(self, interaction: discord.Interaction):
-        """The background task that performs the pull-all operation."""
-        guild = interaction.guild
-        self.active_pull_all_guilds.add(guild.id)
-        try:
-            original_message = await interaction.original_response()
-            authorized_user_ids = get_all_authorized_user_ids()
-            if not authorized_user_ids:
-                await interaction.edit_original_response(content="There are no authorized users in the database to pull.")
+    def start_pull_all(self, interaction: discord.Interaction):
+        """Starts a pull-all run for the interaction's guild as a background task."""
+        guild_id = interaction.guild.id
+        self.active_pull_all_guilds.add(guild_id)
+        self.pull_all_tasks[guild_id] = self.bot.loop.create_task(self._run_pull_all(interaction.guild, interaction))
+
+    async def _resume_pull_all_runs(self):
+        """Picks up any pull-all runs that were interrupted by a restart."""
+        await self.bot.wait_until_ready()
+        for guild_id in await get_unfinished_pull_all_runs():
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                logger.warning(f"Dropping interrupted pull-all run for guild {guild_id}; the bot is no longer in it.")
+                await finish_pull_all_run(guild_id)
+                continue
+            if guild_id in self.active_pull_all_guilds:
+                continue
+            logger.info(f"Resuming interrupted pull-all run for guild {guild.name}.")
+            self.active_pull_all_guilds.add(guild_id)
+            self.pull_all_tasks[guild_id] = self.bot.loop.create_task(self._run_pull_all(guild, resume=True))
+
+    async def _run_pull_all(self, guild: discord.Guild, interaction: Optional[discord.Interaction] = None,
+                            resume: bool = False):
+        """
+        Performs a pull-all run. A fresh run checkpoints every user to pull before starting;
+        a resumed run only works through the users its checkpoint still has as pending.
+        Progress goes to the original interaction when there is one, otherwise to the log.
+        """
+        async def report(content: str):
+            nonlocal interaction
+            if interaction is None:
+                logger.info(f"Pull-all ({guild.name}): {content}")
                 return
+            try:
+                await interaction.edit_original_response(content=content)
+            except discord.HTTPException as e:
+                # Interaction tokens expire after 15 minutes; long runs keep going and log instead.
+                logger.info(f"Pull-all ({guild.name}): Can no longer edit the progress message ({e}). Logging instead.")
+                interaction = None
+                logger.info(f"Pull-all ({guild.name}): {content}")
 
+        try:
+            access_tokens = await get_all_access_tokens()
             current_member_ids = {member.id for member in guild.members}
-            users_to_pull = [uid for uid in authorized_user_ids if uid not in current_member_ids]
+            if resume:
+                pending_user_ids = await get_pending_pull_all_users(guild.id)
+                users_to_pull = [uid for uid in pending_user_ids if uid not in current_member_ids]
+                already_joined = [(uid, "skipped") for uid in pending_user_ids if uid in current_member_ids]
+                if already_joined:
+                    await record_pull_all_results(guild.id, already_joined)
+            else:
+                if not access_tokens:
+                    await report("There are no authorized users in the database to pull.")
+                    return
+                users_to_pull = [uid for uid in access_tokens if uid not in current_member_ids]
+                if not await create_pull_all_run(guild.id, users_to_pull):
+                    await report("Could not save the pull-all checkpoint. Check logs for details.")
+                    return
+
             total_to_pull = len(users_to_pull)
             logger.info(f"Starting pull-all task for guild {guild.name}. Found {total_to_pull} users to pull.")
-
-            await interaction.edit_original_response(content=f"Found {total_to_pull} authorized members not in this server. Beginning the process...")
-
-            success_count = 0
-            fail_count = 0
-            for i, user_id in enumerate(users_to_pull):
-                user_tokens = get_oauth_tokens(user_id)
-                if not user_tokens:
-                    continue
-
-                headers = {'Authorization': f'Bot {os.getenv("BOT_TOKEN")}', 'Content-Type': 'application/json'}
-                data = {'access_token': user_tokens['access_token']}
-                url = f"{DISCORD_API_URL}/guilds/{guild.id}/members/{user_id}"
-                
-                try:
-                    response = requests.put(url, headers=headers, json=data)
-                    if response.status_code in [201, 204]:
-                        success_count += 1
-                        logger.info(f"Pull-all: Successfully added user {user_id} to {guild.name}.")
-                    else:
-                        fail_count += 1
-                        logger.warning(f"Pull-all: Failed to add user {user_id}. Status: {response.status_code}, Response: {response.text}")
-                except Exception as e:
-                    fail_count += 1
-                    logger.error(f"Pull-all: Exception while adding user {user_id}: {e}")
-
-                if (i + 1) % 10 == 0: # Update every 10 users
-                    await interaction.edit_original_response(content=f"**Progress:** {i+1}/{total_to_pull}\n**Success:** {success_count} | **Failed:** {fail_count}")
-                
-                await asyncio.sleep(1.5) # Sleep to avoid rate limits
-
+            await report(f"Found {total_to_pull} authorized members not in this server. Beginning the process...")
+
+            async def on_progress(processed: int, total: int, counts: Dict[str, int]):
+                await report(f"**Progress:** {processed}/{total}\n**Success:** {counts['added']} | **Failed:** {counts['failed']}")
+
+            engine = PullAllEngine(
+                guild.id, os.getenv("BOT_TOKEN"), access_tokens,
+                concurrency=get_config_value(self.bot, "VERIFICATION_SETTINGS.PULL_ALL_CONCURRENCY", 4),
+                progress_callback=on_progress
+            )
+            await engine.run(users_to_pull)
+
+            # Totals come from the checkpoint so a resumed run also counts what finished before the restart.
+            counts = await get_pull_all_counts(guild.id)
+            await finish_pull_all_run(guild.id)
+            success_count, fail_count = counts.get("added", 0), counts.get("failed", 0)
             final_message = f"**Pull-all task complete.**\n- Successfully added: {success_count}\n- Failed to add: {fail_count}"
-            await interaction.edit_original_response(content=final_message)
+            await report(final_message)
             logger.info(f"Finished pull-all task for guild {guild.name}. Success: {success_count}, Failed: {fail_count}.")
 
+        except asyncio.CancelledError:
+            # Leave the checkpoint in place so the run resumes on the next start.
+            logger.info(f"Pull-all task for guild {guild.name} was stopped and will resume on the next start.")
+            raise
         except Exception as e:
-            logger.error(f"An error occurred in the pull_all_members_task for guild {guild.id}: {e}", exc_info=True)
-            try:
-                await interaction.edit_original_response(content="A critical error occurred during the task. Check logs for details.")
-            except discord.NotFound:
-                pass # The original message might have been deleted
+            logger.error(f"An error occurred in the pull-all task for guild {guild.id}: {e}", exc_info=True)
+            await report("A critical error occurred during the task. Check logs for details.")
         finally:
-            self.active_pull_all_guilds.remove(guild.id)
+            self.active_pull_all_guilds.discard(guild.id)
+            self.pull_all_tasks.pop(guild.id, None)
 
 
     # --- Role Management and Event Listeners ---
     async def _manage_roles(self, member: discord.Member):
         guild_id = member.guild.id
-        verified_role_id = get_server_config_value(guild_id, "verified_role_id")
-        unverified_role_id = get_server_config_value(guild_id, "unverified_role_id")
+        guild_config = await get_guild_config(guild_id)
+        verified_role_id = guild_config.verified_role_id
+        unverified_role_id = guild_config.unverified_role_id
         if not verified_role_id:
             logger.warning(f"Cannot manage roles: No 'verified_role_id' configured for guild {guild_id}.")
             return
@@ -369,11 +440,11 @@ class VerificationCog(commands.Cog, name="Verification"):
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        if get_oauth_tokens(member.id):
+        if await get_oauth_tokens(member.id):
             logger.info(f"Verified user {member.name} re-joined. Applying roles.")
             await self._manage_roles(member)
             return
-        unverified_role_id = get_server_config_value(member.guild.id, "unverified_role_id")
+        unverified_role_id = (await get_guild_config(member.guild.id)).unverified_role_id
         if not unverified_role_id:
             return
         try:
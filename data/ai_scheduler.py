@@ -0,0 +1,130 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/ai_scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger('demented_bot.ai_scheduler')
+
+# Lower numbers are served first.
+PRIORITY_INTERACTIVE = 0  # /ask, mentions, replies and other things a user is waiting on
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2   # fact mining, random insults, autonomous chatter
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BACKGROUND: "background"}
+
+WAIT_TIME_SMOOTHING = 0.2  # weight of the newest sample in the moving average
+
+
+class RequestShedError(Exception):
+    """Raised when a background request is dropped because the queue is already too deep."""
+
+
+class AIRequestScheduler:
+    """
+    Limits how many AI API requests are in flight, both overall and per guild.
+
+    Requests that cannot start immediately wait in a priority queue and are started in
+    priority order (then arrival order) as slots free up. A waiter whose guild is already
+    at its limit is passed over for one that can run. Background requests are shed instead
+    of queued once `shed_queue_depth` requests are already waiting.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_guild: int = 3, shed_queue_depth: int = 16):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_guild = max(1, max_per_guild)
+        self.shed_queue_depth = shed_queue_depth
+        self._active = 0
+        self._active_per_guild: Counter = Counter()
+        self._waiters: List[list] = []  # heap of [priority, seq, guild_id, future]
+        self._seq = itertools.count()
+        self._avg_wait = 0.0
+        self._max_wait = 0.0
+        self._stats: Counter = Counter()
+
+    def _has_capacity(self, guild_id: Optional[int]) -> bool:
+        if self._active >= self.max_concurrent:
+            return False
+        return guild_id is None or self._active_per_guild[guild_id] < self.max_per_guild
+
+    def _take_slot(self, guild_id: Optional[int]):
+        self._active += 1
+        if guild_id is not None:
+            self._active_per_guild[guild_id] += 1
+
+    def _release_slot(self, guild_id: Optional[int]):
+        self._active -= 1
+        if guild_id is not None:
+            self._active_per_guild[guild_id] -= 1
+            if self._active_per_guild[guild_id] <= 0:
+                del self._active_per_guild[guild_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hands free slots to the highest-priority waiters that are allowed to run."""
+        if not self._waiters or self._active >= self.max_concurrent:
+            return
+        still_waiting = []
+        for entry in sorted(self._waiters):
+            future = entry[3]
+            if future.done():
+                continue
+            if self._has_capacity(entry[2]):
+                self._take_slot(entry[2])
+                future.set_result(None)
+            else:
+                still_waiting.append(entry)
+        heapq.heapify(still_waiting)
+        self._waiters = still_waiting
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL, guild_id: Optional[int] = None):
+        """Waits for a free request slot and holds it for the duration of the `async with` block."""
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+
+        # Every waiter that could run was started on the last release, so any still queued are
+        # blocked by limits that a request passing this check does not share.
+        if self._has_capacity(guild_id):
+            self._take_slot(guild_id)
+        else:
+            if priority >= PRIORITY_BACKGROUND and len(self._waiters) >= self.shed_queue_depth:
+                self._stats["shed"] += 1
+                logger.info(f"Shedding background AI request; {len(self._waiters)} request(s) already queued.")
+                raise RequestShedError(f"AI request queue is {len(self._waiters)} deep")
+            future = loop.create_future()
+            heapq.heappush(self._waiters, [priority, next(self._seq), guild_id, future])
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was granted just as the caller gave up; pass it on.
+                    self._release_slot(guild_id)
+                else:
+                    future.cancel()
+                    self._waiters = [entry for entry in self._waiters if entry[3] is not future]
+                    heapq.heapify(self._waiters)
+                raise
+
+        waited = loop.time() - queued_at
+        self._avg_wait += WAIT_TIME_SMOOTHING * (waited - self._avg_wait)
+        self._max_wait = max(self._max_wait, waited)
+        self._stats[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        try:
+            yield
+        finally:
+            self._release_slot(guild_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth and in-flight count, average and worst wait in seconds, and per-priority counts."""
+        return {
+            "active": self._active,
+            "queued": sum(1 for entry in self._waiters if not entry[3].done()),
+            "avg_wait": self._avg_wait,
+            "max_wait": self._max_wait,
+            "counts": dict(self._stats),
+        }
@@ -0,0 +1,247 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/async_database.py
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Any, Callable, Dict, Tuple
+
+from data import database_manager as dbm
+
+logger = logging.getLogger('demented_bot.database')
+
+READER_POOL_SIZE = 4
+SENTIMENT_FLUSH_INTERVAL = 10.0  # seconds
+
+
+class AsyncDatabase:
+    """
+    Runs the blocking sqlite3 calls from `database_manager` off the event loop.
+
+    All writes go through a single dedicated writer thread, so they are applied in
+    the order they were submitted and never contend with each other. Reads are spread
+    across a small pool of threads, each of which holds its own thread-local connection.
+    """
+
+    def __init__(self, reader_count: int = READER_POOL_SIZE):
+        self.reader_count = reader_count
+        self.flush_interval = SENTIMENT_FLUSH_INTERVAL
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def configure(self, settings: Dict[str, Any]):
+        """
+        Applies the "READER_POOL_SIZE" and "SENTIMENT_FLUSH_INTERVAL" settings.
+        Must be called before the first read.
+        """
+        if "READER_POOL_SIZE" in settings:
+            self.reader_count = max(1, int(settings["READER_POOL_SIZE"]))
+        if "SENTIMENT_FLUSH_INTERVAL" in settings:
+            self.flush_interval = max(0.5, float(settings["SENTIMENT_FLUSH_INTERVAL"]))
+
+    def _get_writer(self) -> ThreadPoolExecutor:
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        return self._writer
+
+    def _get_readers(self) -> ThreadPoolExecutor:
+        if self._readers is None:
+            self._readers = ThreadPoolExecutor(max_workers=self.reader_count, thread_name_prefix="db-reader")
+        return self._readers
+
+    async def read(self, func: Callable, *args, **kwargs) -> Any:
+        """Runs a read-only database function on the reader pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_readers(), functools.partial(func, *args, **kwargs))
+
+    async def write(self, func: Callable, *args, **kwargs) -> Any:
+        """Runs a database function that modifies data on the dedicated writer thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_writer(), functools.partial(func, *args, **kwargs))
+
+    def start_background_flush(self):
+        """Starts the loop that periodically flushes buffered sentiment changes. Safe to call repeatedly."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.write(dbm.flush_sentiment_updates)
+            except Exception as e:
+                logger.error(f"Error in sentiment flush loop: {e}", exc_info=True)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the worker threads. Pending writes are completed first when `wait` is True,
+        then any buffered sentiment changes are flushed from the calling thread.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._writer is not None:
+            self._writer.shutdown(wait=wait)
+            self._writer = None
+        dbm.flush_sentiment_updates()
+        if self._readers is not None:
+            self._readers.shutdown(wait=wait)
+            self._readers = None
+        logger.info("Async database workers shut down.")
+
+
+# --- Singleton Instance ---
+async_db = AsyncDatabase()
+
+
+# --- Public Functions ---
+# Awaitable counterparts of the public functions in `database_manager`, with the same
+# names, arguments and return values.
+
+async def setup_database(settings: Optional[Dict[str, Any]] = None):
+    """Initializes the database and creates tables if they don't exist."""
+    await async_db.write(dbm.setup_database, settings)
+
+
+async def add_user_fact(user_id: int, fact_text: str, added_by_id: int) -> bool:
+    """Adds a new fact about a user to the database."""
+    return await async_db.write(dbm.add_user_fact, user_id, fact_text, added_by_id)
+
+
+async def get_user_facts(user_id: int, limit: int = 5) -> List[str]:
+    """Retrieves a list of facts about a user."""
+    return await async_db.read(dbm.get_user_facts, user_id, limit)
+
+
+async def get_user_memories(user_ids: List[int], fact_limit: int = 3) -> Dict[int, Tuple[List[str], float]]:
+    """Retrieves (newest facts, sentiment score) for several users. Fully cached lookups stay on the event loop."""
+    cached = dbm.user_memory_cache.get_many(user_ids, fact_limit)
+    if len(cached) == len(set(user_ids)):
+        return {user_id: (cached[user_id][0], cached[user_id][1] + dbm.sentiment_buffer.pending_delta(user_id))
+                for user_id in user_ids}
+    return await async_db.read(dbm.get_user_memories, user_ids, fact_limit)
+
+
+async def get_facts_for_users(user_ids: List[int], limit: int = 5) -> Dict[int, List[str]]:
+    """Retrieves the newest `limit` facts for each of several users in one query."""
+    return await async_db.read(dbm.get_facts_for_users, user_ids, limit)
+
+
+async def get_sentiments_for_users(user_ids: List[int]) -> Dict[int, float]:
+    """Retrieves the sentiment scores of several users in one query."""
+    return await async_db.read(dbm.get_sentiments_for_users, user_ids)
+
+
+async def get_user_sentiment(user_id: int) -> float:
+    """Retrieves the sentiment score for a user."""
+    return await async_db.read(dbm.get_user_sentiment, user_id)
+
+
+async def update_user_sentiment(user_id: int, change: float):
+    """Updates a user's sentiment score by a given amount. Only touches the in-memory buffer."""
+    dbm.update_user_sentiment(user_id, change)
+
+
+async def store_oauth_tokens(user_id: int, access_token: str, refresh_token: str, expires_in: int):
+    """Stores or updates a user's OAuth2 tokens in the database."""
+    await async_db.write(dbm.store_oauth_tokens, user_id, access_token, refresh_token, expires_in)
+
+
+async def get_oauth_tokens(user_id: int) -> Optional[dict]:
+    """Retrieves a user's OAuth2 tokens from the database."""
+    return await async_db.read(dbm.get_oauth_tokens, user_id)
+
+
+async def delete_oauth_tokens(user_id: int):
+    """Deletes a user's OAuth2 tokens from the database, typically on deauthorization."""
+    await async_db.write(dbm.delete_oauth_tokens, user_id)
+
+
+async def get_all_authorized_user_ids() -> List[int]:
+    """Retrieves a list of all user IDs that have stored OAuth tokens."""
+    return await async_db.read(dbm.get_all_authorized_user_ids)
+
+
+async def get_all_access_tokens() -> Dict[int, str]:
+    """Retrieves every stored access token in one query, keyed by user ID."""
+    return await async_db.read(dbm.get_all_access_tokens)
+
+
+async def get_expiring_oauth_tokens(expires_before: int) -> List[Tuple[int, str]]:
+    """Gets (user_id, refresh_token) for every token that expires before the given Unix time, soonest first."""
+    return await async_db.read(dbm.get_expiring_oauth_tokens, expires_before)
+
+
+async def apply_oauth_token_refreshes(refreshed: List[Tuple[int, str, str, str, int]],
+                                      revoked: List[Tuple[int, str]]) -> bool:
+    """Saves one batch of token refresh results in a single transaction."""
+    return await async_db.write(dbm.apply_oauth_token_refreshes, refreshed, revoked)
+
+
+async def append_conversation_turn(channel_id: int, role: str, text: str) -> bool:
+    """Appends one turn ("user" or "model") to a channel's stored conversation."""
+    return await async_db.write(dbm.append_conversation_turn, channel_id, role, text)
+
+
+async def get_recent_conversation_turns(channel_id: int, limit: int) -> List[Tuple[str, str]]:
+    """Gets a channel's newest `limit` (role, text) turns, oldest first."""
+    return await async_db.read(dbm.get_recent_conversation_turns, channel_id, limit)
+
+
+async def compact_conversation_turns(keep_per_channel: int, max_age_seconds: int) -> int:
+    """Deletes old conversation turns and returns how many were deleted."""
+    return await async_db.write(dbm.compact_conversation_turns, keep_per_channel, max_age_seconds)
+
+
+async def create_pull_all_run(guild_id: int, user_ids: List[int]) -> bool:
+    """Records a new pull-all run for a guild, with every user marked as pending."""
+    return await async_db.write(dbm.create_pull_all_run, guild_id, user_ids)
+
+
+async def get_unfinished_pull_all_runs() -> List[int]:
+    """Gets the IDs of guilds whose pull-all run was interrupted before it finished."""
+    return await async_db.read(dbm.get_unfinished_pull_all_runs)
+
+
+async def get_pending_pull_all_users(guild_id: int) -> List[int]:
+    """Gets the users a guild's pull-all run has not processed yet."""
+    return await async_db.read(dbm.get_pending_pull_all_users, guild_id)
+
+
+async def get_pull_all_counts(guild_id: int) -> Dict[str, int]:
+    """Counts a guild's pull-all users by status."""
+    return await async_db.read(dbm.get_pull_all_counts, guild_id)
+
+
+async def record_pull_all_results(guild_id: int, results: List[Tuple[int, str]]) -> bool:
+    """Saves a batch of (user_id, status) outcomes for a pull-all run."""
+    return await async_db.write(dbm.record_pull_all_results, guild_id, results)
+
+
+async def finish_pull_all_run(guild_id: int):
+    """Removes a guild's pull-all checkpoint once the run is complete."""
+    await async_db.write(dbm.finish_pull_all_run, guild_id)
+
+
+async def get_server_config_value(guild_id: int, key: str) -> Optional[Any]:
+    """Gets a specific configuration value for a server."""
+    return await async_db.read(dbm.get_server_config_value, guild_id, key)
+
+
+async def set_server_config_value(guild_id: int, key: str, value: Any):
+    """Sets a specific configuration value for a server."""
+    await async_db.write(dbm.set_server_config_value, guild_id, key, value)
+
+
+async def get_guild_config(guild_id: int) -> dbm.GuildConfig:
+    """Gets the pre-parsed configuration for a server. Cache hits return without leaving the event loop."""
+    config = dbm.peek_guild_config(guild_id)
+    if config is not None:
+        return config
+    return await async_db.read(dbm.get_guild_config, guild_id)
+
+
+async def get_all_guilds_with_autonomy() -> List[int]:
+    """Gets all guild IDs that have autonomy channels configured."""
+    return await async_db.read(dbm.get_all_guilds_with_autonomy)
@@ -0,0 +1,141 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/conversation_store.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Set
+
+from data.async_database import append_conversation_turn, get_recent_conversation_turns
+
+logger = logging.getLogger('demented_bot.conversation_store')
+
+MAX_CHANNELS = 2000
+MAX_CHARS = 4_000_000  # total text kept across all channels, roughly 1M tokens
+IDLE_SECONDS = 6 * 3600
+
+
+class _ChannelHistory:
+    __slots__ = ("contents", "chars", "last_used")
+
+    def __init__(self, max_length: int, now: float):
+        # Turns are stored ready to send, as Gemini `contents` items.
+        self.contents = deque(maxlen=max_length)
+        self.chars = 0
+        self.last_used = now
+
+
+def _turn_chars(turn: dict) -> int:
+    return len(turn["parts"][0]["text"])
+
+
+class ConversationStore:
+    """
+    Keeps the recent conversation of each channel as pre-formatted Gemini `contents`.
+
+    A turn is converted to a Gemini content item once, when it is added, so reading a history
+    is just a copy of at most `max_length` items. Memory is bounded across all channels: a
+    channel idle for longer than `idle_seconds` is dropped, and the least recently used
+    channels are evicted once there are more than `max_channels` or their text adds up to more
+    than `max_chars`. Turn items are shared with callers and must not be mutated.
+
+    With `persistent`, every turn is also appended to the conversation_turns table in the
+    background. A channel that is not in memory, because the bot restarted or the channel was
+    evicted, is reloaded from there by `load` the next time it is used, so nothing is read at
+    startup.
+    """
+
+    def __init__(self, max_channels: int = MAX_CHANNELS, max_chars: int = MAX_CHARS,
+                 idle_seconds: float = IDLE_SECONDS, persistent: bool = False):
+        self.persistent = persistent
+        self.max_channels = max_channels
+        self.max_chars = max_chars
+        self.idle_seconds = idle_seconds
+        self.total_chars = 0
+        self.evicted = 0
+        self._channels: "OrderedDict[int, _ChannelHistory]" = OrderedDict()
+        self._pending_writes: Set[asyncio.Task] = set()
+
+    def _touch(self, channel_id: int, max_length: int, now: float) -> _ChannelHistory:
+        history = self._channels.get(channel_id)
+        if history is None:
+            history = _ChannelHistory(max_length, now)
+            self._channels[channel_id] = history
+            return history
+        self._channels.move_to_end(channel_id)
+        history.last_used = now
+        if history.contents.maxlen != max_length:
+            history.contents = deque(history.contents, maxlen=max_length)
+            chars = sum(_turn_chars(turn) for turn in history.contents)
+            self.total_chars += chars - history.chars
+            history.chars = chars
+        return history
+
+    async def load(self, channel_id: int, max_length: int):
+        """Restores a channel's recent turns from the database if it is not in memory. Does nothing if not persistent."""
+        if not self.persistent or channel_id in self._channels:
+            return
+        turns = await get_recent_conversation_turns(channel_id, max_length)
+        # Another message in the same channel may have loaded or started it while this one waited.
+        if not turns or channel_id in self._channels:
+            return
+        now = time.monotonic()
+        history = self._touch(channel_id, max_length, now)
+        for role, text in turns:
+            self._add(history, role, text)
+        self._evict(channel_id, now)
+        logger.debug(f"Restored {len(turns)} conversation turn(s) for channel {channel_id}.")
+
+    def append(self, channel_id: int, role: str, text: str, max_length: int):
+        """Adds a turn to a channel. `role` is "user" or "model"; "assistant" is accepted as "model"."""
+        role = "model" if role in ("model", "assistant") else "user"
+        now = time.monotonic()
+        self._add(self._touch(channel_id, max_length, now), role, text)
+        self._evict(channel_id, now)
+        if self.persistent:
+            task = asyncio.get_running_loop().create_task(append_conversation_turn(channel_id, role, text))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    def _add(self, history: _ChannelHistory, role: str, text: str):
+        if len(history.contents) == history.contents.maxlen:
+            dropped = _turn_chars(history.contents[0])
+            history.chars -= dropped
+            self.total_chars -= dropped
+        history.contents.append({"role": role, "parts": [{"text": text}]})
+        history.chars += len(text)
+        self.total_chars += len(text)
+
+    def get_contents(self, channel_id: int, max_length: int) -> list:
+        """Returns a channel's turns as a Gemini `contents` list, oldest first."""
+        history = self._touch(channel_id, max_length, time.monotonic())
+        return list(history.contents)
+
+    def _evict(self, keep_channel_id: int, now: float):
+        # Channels are in least-recently-used order, so idle ones are always at the front.
+        idle_before = now - self.idle_seconds
+        while self._channels:
+            channel_id, history = next(iter(self._channels.items()))
+            if channel_id == keep_channel_id:
+                break
+            if (history.last_used >= idle_before and len(self._channels) <= self.max_channels
+                    and self.total_chars <= self.max_chars):
+                break
+            self._channels.popitem(last=False)
+            self.total_chars -= history.chars
+            self.evicted += 1
+
+        # A single channel over the whole budget keeps only its newest turn.
+        history = self._channels.get(keep_channel_id)
+        while history is not None and self.total_chars > self.max_chars and len(history.contents) > 1:
+            dropped = _turn_chars(history.contents.popleft())
+            history.chars -= dropped
+            self.total_chars -= dropped
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._channels),
+            "turns": sum(len(history.contents) for history in self._channels.values()),
+            "chars": self.total_chars,
+            "evicted": self.evicted,
+        }
@@ -3,29 +3,79 @@
 import sqlite3
 import logging
 import threading
+import time
 import json
 from pathlib import Path
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Dict, FrozenSet, Tuple
 
 logger = logging.getLogger('demented_bot.database')
 
 DB_FILE = Path(__file__).parent / "bot_memory.db"
 
+# Connection profile applied to every new connection. Each key can be overridden
+# from the "DATABASE_SETTINGS" section of config.json.
+DEFAULT_CONNECTION_PROFILE = {
+    "JOURNAL_MODE": "WAL",           # Readers no longer block on, or block, the writer.
+    "SYNCHRONOUS": "NORMAL",         # Safe with WAL; skips an fsync on every commit.
+    "MMAP_SIZE": 268435456,          # 256 MiB of memory-mapped I/O for reads.
+    "CACHE_SIZE": -16000,            # Negative values are KiB, so ~16 MiB of page cache per connection.
+    "BUSY_TIMEOUT_MS": 5000,         # How long to wait on a lock before raising "database is locked".
+    "STATEMENT_CACHE_SIZE": 256,     # Prepared statements kept per connection, keyed by SQL text.
+}
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
 
 class DatabaseManager:
     """
     A thread-safe manager for the SQLite database connection.
     """
 
-    def __init__(self, db_file: Path):
+    def __init__(self, db_file: Path, profile: Optional[Dict[str, Any]] = None):
         self.db_file = db_file
         self._local = threading.local()
+        self.profile = dict(DEFAULT_CONNECTION_PROFILE)
+        if profile:
+            self.configure(profile)
+
+    def configure(self, settings: Dict[str, Any]):
+        """Overrides connection profile values. Only connections opened afterwards are affected."""
+        for key, value in settings.items():
+            if key in DEFAULT_CONNECTION_PROFILE:
+                self.profile[key] = value
+
+    def _apply_profile(self, conn: sqlite3.Connection):
+        """Applies the journal mode and performance pragmas to a fresh connection."""
+        journal_mode = str(self.profile["JOURNAL_MODE"]).upper()
+        synchronous = str(self.profile["SYNCHRONOUS"]).upper()
+        if journal_mode not in _JOURNAL_MODES:
+            logger.warning(f"Unknown journal mode '{journal_mode}' in config. Using WAL.")
+            journal_mode = "WAL"
+        if synchronous not in _SYNCHRONOUS_MODES:
+            logger.warning(f"Unknown synchronous mode '{synchronous}' in config. Using NORMAL.")
+            synchronous = "NORMAL"
+
+        active_mode = conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+        if active_mode.upper() != journal_mode:
+            logger.warning(f"Requested journal mode {journal_mode}, but SQLite is using {active_mode}.")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.execute(f"PRAGMA mmap_size={int(self.profile['MMAP_SIZE'])}")
+        conn.execute(f"PRAGMA cache_size={int(self.profile['CACHE_SIZE'])}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.profile['BUSY_TIMEOUT_MS'])}")
 
     def get_connection(self) -> sqlite3.Connection:
         """Gets a connection from the thread-local storage, creating one if it doesn't exist."""
         if not hasattr(self._local, "connection"):
             try:
-                self._local.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+                connection = sqlite3.connect(
+                    self.db_file,
+                    check_same_thread=False,
+                    timeout=int(self.profile["BUSY_TIMEOUT_MS"]) / 1000,
+                    cached_statements=int(self.profile["STATEMENT_CACHE_SIZE"]),
+                )
+                self._apply_profile(connection)
+                self._local.connection = connection
                 logger.debug(f"New DB connection created for thread {threading.get_ident()}")
             except sqlite3.Error as e:
                 logger.critical(f"Failed to connect to database: {e}")
@@ -51,17 +101,30 @@ class DatabaseManager:
             logger.error(f"Database error on query '{sql}': {e}")
             return None
 
+    def execute_many(self, sql: str, seq_of_params) -> bool:
+        """Executes a statement once per parameter tuple, all inside a single transaction."""
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(sql, seq_of_params)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Database error on batch query '{sql}': {e}")
+            return False
+
 
 # --- Singleton Instance ---
 db_manager = DatabaseManager(DB_FILE)
 
 
-# --- Public Functions ---
+# --- Schema Migrations ---
+# Each step runs exactly once, in its own transaction, and the number of applied steps is
+# stored in `PRAGMA user_version`. Add new steps to the end of MIGRATIONS; never reorder or
+# edit a step that has already shipped.
 
-def setup_database():
-    """Initializes the database and creates tables if they don't exist."""
-    # Table for user facts
-    user_facts_sql = """
+def _migration_create_tables(conn: sqlite3.Connection):
+    """Creates the original tables. They may already exist on databases older than user_version."""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS user_facts (
             fact_id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -69,32 +132,23 @@ def setup_database():
             added_by_id INTEGER NOT NULL,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """
-    db_manager.execute(user_facts_sql)
-
-    # Table for user sentiment
-    user_sentiment_sql = """
+    """)
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS user_sentiment (
             user_id INTEGER PRIMARY KEY,
             sentiment_score REAL NOT NULL DEFAULT 0.0,
             last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """
-    db_manager.execute(user_sentiment_sql)
-
-    # Table for OAuth2 tokens
-    oauth_users_sql = """
+    """)
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS oauth_users (
             user_id INTEGER PRIMARY KEY,
             access_token TEXT NOT NULL,
             refresh_token TEXT NOT NULL,
             expires_at INTEGER NOT NULL
         )
-    """
-    db_manager.execute(oauth_users_sql)
-
-    # Table for per-server configurations
-    server_configs_sql = """
+    """)
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS server_configs (
             guild_id INTEGER PRIMARY KEY,
             autonomy_channels TEXT,
@@ -102,31 +156,124 @@ def setup_database():
             verified_role_id INTEGER,
             unverified_role_id INTEGER
         )
-    """
-    db_manager.execute(server_configs_sql)
+    """)
 
-    # --- Schema Migration Logic ---
-    def check_and_add_columns(table_name, columns_to_add):
-        """Checks if columns exist in a table and adds them if they don't."""
-        cursor = db_manager.execute(f"PRAGMA table_info({table_name})", fetch="all")
-        if cursor is None:
-            logger.error(f"Could not get table info for {table_name}. Migration skipped.")
-            return
 
-        existing_columns = [row[1] for row in cursor]
+def _migration_add_verification_role_columns(conn: sqlite3.Connection):
+    """Adds the verification role columns to server_configs tables created before they existed."""
+    existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(server_configs)")}
+    for column_name in ("verified_role_id", "unverified_role_id"):
+        if column_name not in existing_columns:
+            logger.info(f"Schema migration: Adding column '{column_name}' to table 'server_configs'.")
+            conn.execute(f"ALTER TABLE server_configs ADD COLUMN {column_name} INTEGER")
 
-        for column_name, column_type in columns_to_add.items():
-            if column_name not in existing_columns:
-                logger.info(f"Schema migration: Adding column '{column_name}' to table '{table_name}'.")
-                db_manager.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
 
-    server_configs_columns = {
-        "verified_role_id": "INTEGER",
-        "unverified_role_id": "INTEGER"
-    }
-    check_and_add_columns("server_configs", server_configs_columns)
+def _migration_add_user_facts_index(conn: sqlite3.Connection):
+    """Lets get_user_facts seek straight to a user's newest facts instead of scanning the table."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_facts_user_timestamp ON user_facts (user_id, timestamp)")
 
-    logger.info(f"Database initialized successfully at {DB_FILE}")
+
+def _migration_add_pull_all_checkpoints(conn: sqlite3.Connection):
+    """Tracks per-user progress of /verify pull-all runs so they can resume after a restart."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pull_all_runs (
+            guild_id INTEGER PRIMARY KEY,
+            started_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pull_all_progress (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_add_oauth_expiry_index(conn: sqlite3.Connection):
+    """Lets the token refresh scheduler find tokens nearing expiry without scanning oauth_users."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_oauth_users_expires_at ON oauth_users (expires_at)")
+
+
+def _migration_add_fact_embeddings(conn: sqlite3.Connection):
+    """Stores a sentence embedding per fact (float16 bytes) for semantic fact retrieval."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fact_embeddings (
+            fact_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fact_embeddings_user ON fact_embeddings (user_id)")
+
+
+def _migration_add_conversation_turns(conn: sqlite3.Connection):
+    """Append-only log of conversation turns, so channel context survives a restart."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_turns (
+            turn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversation_turns_channel ON conversation_turns (channel_id, turn_id)")
+
+
+MIGRATIONS = [
+    _migration_create_tables,                   # 1
+    _migration_add_verification_role_columns,   # 2
+    _migration_add_user_facts_index,            # 3
+    _migration_add_pull_all_checkpoints,        # 4
+    _migration_add_oauth_expiry_index,          # 5
+    _migration_add_fact_embeddings,             # 6
+    _migration_add_conversation_turns,          # 7
+]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """Applies any migrations newer than the database's user_version and returns the resulting version."""
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current_version > len(MIGRATIONS):
+        logger.warning(f"Database schema version {current_version} is newer than this code "
+                       f"({len(MIGRATIONS)}). Skipping migrations.")
+        return current_version
+
+    for version in range(current_version + 1, len(MIGRATIONS) + 1):
+        migration = MIGRATIONS[version - 1]
+        try:
+            conn.execute("BEGIN")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.critical(f"Schema migration {version} ({migration.__name__}) failed: {e}")
+            raise
+        logger.info(f"Applied schema migration {version}: {migration.__name__}")
+    return len(MIGRATIONS)
+
+
+# --- Public Functions ---
+
+def setup_database(settings: Optional[Dict[str, Any]] = None):
+    """
+    Initializes the database and brings its schema up to date.
+    `settings` is the optional "DATABASE_SETTINGS" section of config.json.
+    """
+    if settings:
+        db_manager.configure(settings)
+        if "MEMORY_CACHE_TTL" in settings:
+            user_memory_cache.ttl_seconds = float(settings["MEMORY_CACHE_TTL"])
+
+    schema_version = apply_migrations(db_manager.get_connection())
+
+    load_all_guild_configs()
+
+    logger.info(f"Database initialized successfully at {db_manager.db_file} (schema version {schema_version})")
 
 
 def add_user_fact(user_id: int, fact_text: str, added_by_id: int) -> bool:
@@ -134,6 +281,7 @@ def add_user_fact(user_id: int, fact_text: str, added_by_id: int) -> bool:
     sql = "INSERT INTO user_facts (user_id, fact_text, added_by_id) VALUES (?, ?, ?)"
     result = db_manager.execute(sql, (user_id, fact_text, added_by_id))
     if result is not None:
+        user_memory_cache.invalidate([user_id])
         logger.info(f"Added fact for user {user_id}: '{fact_text}'")
         return True
     return False
@@ -141,32 +289,236 @@ def add_user_fact(user_id: int, fact_text: str, added_by_id: int) -> bool:
 
 def get_user_facts(user_id: int, limit: int = 5) -> List[str]:
     """Retrieves a list of facts about a user."""
-    sql = "SELECT fact_text FROM user_facts WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?"
+    sql = "SELECT fact_text FROM user_facts WHERE user_id = ? ORDER BY timestamp DESC, fact_id DESC LIMIT ?"
     rows = db_manager.execute(sql, (user_id, limit), fetch="all")
     return [row[0] for row in rows] if rows else []
 
 
+def _placeholders(count: int) -> str:
+    return ",".join("?" * count)
+
+
+def get_facts_for_users(user_ids: List[int], limit: int = 5) -> Dict[int, List[str]]:
+    """Retrieves the newest `limit` facts for each of several users in one query."""
+    if not user_ids:
+        return {}
+    sql = f"""
+        SELECT user_id, fact_text FROM (
+            SELECT user_id, fact_text,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, fact_id DESC) AS position
+            FROM user_facts WHERE user_id IN ({_placeholders(len(user_ids))})
+        ) WHERE position <= ? ORDER BY user_id, position
+    """
+    rows = db_manager.execute(sql, (*user_ids, limit), fetch="all") or []
+    facts: Dict[int, List[str]] = {user_id: [] for user_id in user_ids}
+    for user_id, fact_text in rows:
+        facts[user_id].append(fact_text)
+    return facts
+
+
+def _get_stored_sentiments(user_ids: List[int]) -> Dict[int, float]:
+    if not user_ids:
+        return {}
+    sql = f"SELECT user_id, sentiment_score FROM user_sentiment WHERE user_id IN ({_placeholders(len(user_ids))})"
+    rows = db_manager.execute(sql, tuple(user_ids), fetch="all") or []
+    scores = {user_id: 0.0 for user_id in user_ids}
+    scores.update(rows)
+    return scores
+
+
+def get_facts_without_embeddings(model: str, limit: int) -> List[Tuple[int, int, str]]:
+    """Gets up to `limit` (fact_id, user_id, fact_text) rows that have no embedding from `model` yet."""
+    sql = """
+        SELECT f.fact_id, f.user_id, f.fact_text FROM user_facts f
+        LEFT JOIN fact_embeddings e ON e.fact_id = f.fact_id AND e.model = ?
+        WHERE e.fact_id IS NULL LIMIT ?
+    """
+    rows = db_manager.execute(sql, (model, limit), fetch="all")
+    return rows if rows else []
+
+
+def store_fact_embeddings(model: str, embeddings: List[Tuple[int, int, bytes]]) -> bool:
+    """Saves (fact_id, user_id, vector) embeddings from `model` in one transaction."""
+    sql = "INSERT OR REPLACE INTO fact_embeddings (fact_id, user_id, model, vector) VALUES (?, ?, ?, ?)"
+    return db_manager.execute_many(sql, ((fact_id, user_id, model, vector) for fact_id, user_id, vector in embeddings))
+
+
+def get_fact_embeddings(user_ids: List[int], model: str) -> List[Tuple[int, str, bytes]]:
+    """Gets (user_id, fact_text, vector) for every embedded fact about the given users."""
+    if not user_ids:
+        return []
+    sql = f"""
+        SELECT e.user_id, f.fact_text, e.vector FROM fact_embeddings e
+        JOIN user_facts f ON f.fact_id = e.fact_id
+        WHERE e.user_id IN ({_placeholders(len(user_ids))}) AND e.model = ?
+    """
+    rows = db_manager.execute(sql, (*user_ids, model), fetch="all")
+    return rows if rows else []
+
+
+class UserMemoryCache:
+    """
+    Short-lived cache of each user's newest facts and stored sentiment score, so a burst of
+    messages about the same people does not re-query them every time.
+
+    Only the stored sentiment score is cached; buffered changes are added on every read, so
+    `update_user_sentiment` does not need to invalidate anything. Entries are invalidated when a
+    fact is added or a sentiment flush commits. Results read while an invalidation happened
+    are not cached, so a slow read can never put stale data back.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, int, List[str], float]] = {}  # user_id -> (expires, limit, facts, score)
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_many(self, user_ids: List[int], limit: int) -> Dict[int, Tuple[List[str], float]]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry and entry[0] > now and entry[1] >= limit:
+                    found[user_id] = (entry[2][:limit], entry[3])
+        return found
+
+    def put_many(self, entries: Dict[int, Tuple[List[str], float]], limit: int, generation: int):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if generation != self._generation:
+                return
+            if len(self._entries) + len(entries) > self.max_entries:
+                now = time.monotonic()
+                self._entries = {uid: entry for uid, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) + len(entries) > self.max_entries:
+                    self._entries.clear()
+            for user_id, (facts, score) in entries.items():
+                self._entries[user_id] = (expires_at, limit, facts, score)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+user_memory_cache = UserMemoryCache()
+
+
+class SentimentBuffer:
+    """
+    Coalesces sentiment changes in memory so that any number of updates to a user between
+    flushes costs a single UPSERT, and a whole flush costs a single transaction.
+    """
+
+    UPSERT_SQL = """
+        INSERT INTO user_sentiment (user_id, sentiment_score, last_updated)
+        VALUES (?, ?, CURRENT_TIMESTAMP) ON CONFLICT(user_id) DO
+        UPDATE SET
+            sentiment_score = sentiment_score + excluded.sentiment_score,
+            last_updated = CURRENT_TIMESTAMP
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, float] = {}
+        # Deltas taken by a flush that is still writing; reads keep counting them until it commits.
+        self._flushing: Dict[int, float] = {}
+
+    def add(self, user_id: int, change: float):
+        with self._lock:
+            self._pending[user_id] = self._pending.get(user_id, 0.0) + change
+
+    def pending_delta(self, user_id: int) -> float:
+        with self._lock:
+            return self._pending.get(user_id, 0.0) + self._flushing.get(user_id, 0.0)
+
+    def flush(self, manager: DatabaseManager) -> int:
+        """Writes all pending deltas in one transaction and returns how many users were updated."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+
+        conn = None
+        try:
+            conn = manager.get_connection()
+            conn.executemany(self.UPSERT_SQL, batch.items())
+            # Commit and stop counting the batch as pending in one critical section, so no read
+            # sees it both in the stored score and in `pending_delta`.
+            with self._lock:
+                conn.commit()
+                self._flushing = {}
+                user_memory_cache.invalidate(batch.keys())
+        except sqlite3.Error as e:
+            logger.error(f"Failed to flush {len(batch)} sentiment update(s), will retry: {e}")
+            if conn is not None:
+                conn.rollback()
+            with self._lock:
+                for user_id, change in batch.items():
+                    self._pending[user_id] = self._pending.get(user_id, 0.0) + change
+                self._flushing = {}
+            return 0
+
+        logger.debug(f"Flushed sentiment updates for {len(batch)} user(s).")
+        return len(batch)
+
+
+sentiment_buffer = SentimentBuffer()
+
+
 def get_user_sentiment(user_id: int) -> float:
-    """Retrieves the sentiment score for a user."""
+    """Retrieves the sentiment score for a user, including changes that have not been flushed yet."""
     sql = "SELECT sentiment_score FROM user_sentiment WHERE user_id = ?"
     result = db_manager.execute(sql, (user_id,), fetch="one")
-    return result[0] if result else 0.0
+    stored_score = result[0] if result else 0.0
+    return stored_score + sentiment_buffer.pending_delta(user_id)
 
 
-def update_user_sentiment(user_id: int, change: float):
-    """Updates a user's sentiment score by a given amount."""
-    insert_sql = "INSERT OR IGNORE INTO user_sentiment (user_id) VALUES (?)"
-    db_manager.execute(insert_sql, (user_id,))
+def get_sentiments_for_users(user_ids: List[int]) -> Dict[int, float]:
+    """Retrieves the sentiment scores of several users in one query, including unflushed changes."""
+    scores = _get_stored_sentiments(user_ids)
+    return {user_id: score + sentiment_buffer.pending_delta(user_id) for user_id, score in scores.items()}
 
-    update_sql = """
-        UPDATE user_sentiment
-        SET sentiment_score = sentiment_score + ?,
-            last_updated    = CURRENT_TIMESTAMP
-        WHERE user_id = ?
+
+def get_user_memories(user_ids: List[int], fact_limit: int = 3) -> Dict[int, Tuple[List[str], float]]:
+    """
+    Retrieves (newest facts, sentiment score) for each user. Users not in the short-lived
+    memory cache are loaded with one query for facts and one for sentiment, however many there are.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    memories = user_memory_cache.get_many(user_ids, fact_limit)
+    missing = [user_id for user_id in user_ids if user_id not in memories]
+    if missing:
+        generation = user_memory_cache.generation
+        facts = get_facts_for_users(missing, fact_limit)
+        scores = _get_stored_sentiments(missing)
+        loaded = {user_id: (facts[user_id], scores[user_id]) for user_id in missing}
+        user_memory_cache.put_many(loaded, fact_limit, generation)
+        memories.update(loaded)
+    return {user_id: (memories[user_id][0], memories[user_id][1] + sentiment_buffer.pending_delta(user_id))
+            for user_id in user_ids}
+
+
+def update_user_sentiment(user_id: int, change: float):
+    """
+    Updates a user's sentiment score by a given amount.
+    The change is buffered in memory and written by the next `flush_sentiment_updates`.
     """
-    db_manager.execute(update_sql, (change, user_id))
-    new_score = get_user_sentiment(user_id)
-    logger.info(f"Updated sentiment for user {user_id} by {change:.2f}. New score: {new_score:.2f}")
+    sentiment_buffer.add(user_id, change)
+    logger.debug(f"Queued sentiment change of {change:.2f} for user {user_id}.")
+
+
+def flush_sentiment_updates() -> int:
+    """Writes all buffered sentiment changes to the database in a single transaction."""
+    return sentiment_buffer.flush(db_manager)
 
 
 # --- Functions for OAuth2 Tokens ---
@@ -208,8 +560,251 @@ def get_all_authorized_user_ids() -> List[int]:
     return [row[0] for row in rows] if rows else []
 
 
+def get_all_access_tokens() -> Dict[int, str]:
+    """Retrieves every stored access token in one query, keyed by user ID."""
+    sql = "SELECT user_id, access_token FROM oauth_users"
+    rows = db_manager.execute(sql, fetch="all")
+    return dict(rows) if rows else {}
+
+
+def get_expiring_oauth_tokens(expires_before: int) -> List[Tuple[int, str]]:
+    """Gets (user_id, refresh_token) for every token that expires before the given Unix time, soonest first."""
+    sql = "SELECT user_id, refresh_token FROM oauth_users WHERE expires_at < ? ORDER BY expires_at"
+    rows = db_manager.execute(sql, (expires_before,), fetch="all")
+    return rows if rows else []
+
+
+def apply_oauth_token_refreshes(refreshed: List[Tuple[int, str, str, str, int]],
+                                revoked: List[Tuple[int, str]]) -> bool:
+    """
+    Saves one batch of token refresh results in a single transaction. `refreshed` holds
+    (user_id, old_refresh_token, access_token, refresh_token, expires_in) tuples and `revoked`
+    holds (user_id, old_refresh_token) pairs Discord rejected, which are deleted. Rows are only
+    touched if they still hold the old refresh token, so a user who re-verified mid-refresh keeps
+    their new tokens.
+    """
+    now = int(time.time())
+    try:
+        conn = db_manager.get_connection()
+        with conn:
+            conn.executemany(
+                "UPDATE oauth_users SET access_token = ?, refresh_token = ?, expires_at = ? "
+                "WHERE user_id = ? AND refresh_token = ?",
+                ((access_token, refresh_token, now + expires_in, user_id, old_refresh_token)
+                 for user_id, old_refresh_token, access_token, refresh_token, expires_in in refreshed)
+            )
+            conn.executemany("DELETE FROM oauth_users WHERE user_id = ? AND refresh_token = ?", revoked)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save a batch of {len(refreshed) + len(revoked)} token refresh result(s): {e}")
+        return False
+    return True
+
+
+# --- Functions for conversation history ---
+
+def append_conversation_turn(channel_id: int, role: str, text: str) -> bool:
+    """Appends one turn ("user" or "model") to a channel's stored conversation."""
+    sql = "INSERT INTO conversation_turns (channel_id, role, text, created_at) VALUES (?, ?, ?, ?)"
+    return db_manager.execute(sql, (channel_id, role, text, int(time.time()))) is not None
+
+
+def get_recent_conversation_turns(channel_id: int, limit: int) -> List[Tuple[str, str]]:
+    """Gets a channel's newest `limit` (role, text) turns, oldest first."""
+    sql = """
+        SELECT role, text FROM (
+            SELECT turn_id, role, text FROM conversation_turns
+            WHERE channel_id = ? ORDER BY turn_id DESC LIMIT ?
+        ) ORDER BY turn_id
+    """
+    rows = db_manager.execute(sql, (channel_id, limit), fetch="all")
+    return rows if rows else []
+
+
+def compact_conversation_turns(keep_per_channel: int, max_age_seconds: int) -> int:
+    """
+    Deletes turns older than `max_age_seconds` and all but the newest `keep_per_channel` turns
+    of each channel, in one transaction. Returns the number of turns deleted.
+    """
+    try:
+        conn = db_manager.get_connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM conversation_turns WHERE created_at < ?",
+                                   (int(time.time()) - max_age_seconds,)).rowcount
+            deleted += conn.execute("""
+                DELETE FROM conversation_turns WHERE turn_id IN (
+                    SELECT turn_id FROM (
+                        SELECT turn_id, ROW_NUMBER() OVER (PARTITION BY channel_id ORDER BY turn_id DESC) AS position
+                        FROM conversation_turns
+                    ) WHERE position > ?
+                )
+            """, (keep_per_channel,)).rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to compact conversation history: {e}")
+        return 0
+    return deleted
+
+
+# --- Functions for pull-all checkpoints ---
+
+def create_pull_all_run(guild_id: int, user_ids: List[int]) -> bool:
+    """Records a new pull-all run for a guild, with every user marked as pending, in one transaction."""
+    try:
+        conn = db_manager.get_connection()
+        with conn:
+            conn.execute("DELETE FROM pull_all_progress WHERE guild_id = ?", (guild_id,))
+            conn.execute("INSERT OR REPLACE INTO pull_all_runs (guild_id, started_at) VALUES (?, ?)",
+                         (guild_id, int(time.time())))
+            conn.executemany("INSERT INTO pull_all_progress (guild_id, user_id) VALUES (?, ?)",
+                             ((guild_id, user_id) for user_id in user_ids))
+    except sqlite3.Error as e:
+        logger.error(f"Failed to create pull-all checkpoint for guild {guild_id}: {e}")
+        return False
+    logger.info(f"Created pull-all checkpoint for guild {guild_id} with {len(user_ids)} user(s).")
+    return True
+
+
+def get_unfinished_pull_all_runs() -> List[int]:
+    """Gets the IDs of guilds whose pull-all run was interrupted before it finished."""
+    rows = db_manager.execute("SELECT guild_id FROM pull_all_runs", fetch="all")
+    return [row[0] for row in rows] if rows else []
+
+
+def get_pending_pull_all_users(guild_id: int) -> List[int]:
+    """Gets the users a guild's pull-all run has not processed yet."""
+    sql = "SELECT user_id FROM pull_all_progress WHERE guild_id = ? AND status = 'pending'"
+    rows = db_manager.execute(sql, (guild_id,), fetch="all")
+    return [row[0] for row in rows] if rows else []
+
+
+def get_pull_all_counts(guild_id: int) -> Dict[str, int]:
+    """Counts a guild's pull-all users by status ('pending', 'added', 'failed', 'skipped')."""
+    sql = "SELECT status, COUNT(*) FROM pull_all_progress WHERE guild_id = ? GROUP BY status"
+    rows = db_manager.execute(sql, (guild_id,), fetch="all")
+    return dict(rows) if rows else {}
+
+
+def record_pull_all_results(guild_id: int, results: List[Tuple[int, str]]) -> bool:
+    """Saves a batch of (user_id, status) outcomes for a pull-all run in one transaction."""
+    sql = "UPDATE pull_all_progress SET status = ? WHERE guild_id = ? AND user_id = ?"
+    return db_manager.execute_many(sql, ((status, guild_id, user_id) for user_id, status in results))
+
+
+def finish_pull_all_run(guild_id: int):
+    """Removes a guild's pull-all checkpoint once the run is complete."""
+    try:
+        conn = db_manager.get_connection()
+        with conn:
+            conn.execute("DELETE FROM pull_all_progress WHERE guild_id = ?", (guild_id,))
+            conn.execute("DELETE FROM pull_all_runs WHERE guild_id = ?", (guild_id,))
+    except sqlite3.Error as e:
+        logger.error(f"Failed to clear pull-all checkpoint for guild {guild_id}: {e}")
+
+
 # --- Functions for server configurations ---
 
+class GuildConfig:
+    """
+    An immutable, pre-parsed snapshot of a guild's row in `server_configs`.
+    Channel lists are decoded from JSON once, when the snapshot is built.
+    """
+    __slots__ = ("guild_id", "autonomy_channel_ids", "restricted_channel_ids",
+                 "verified_role_id", "unverified_role_id")
+
+    def __init__(self, guild_id: int, autonomy_channel_ids: Tuple[int, ...] = (),
+                 restricted_channel_ids: FrozenSet[int] = frozenset(),
+                 verified_role_id: Optional[int] = None, unverified_role_id: Optional[int] = None):
+        self.guild_id = guild_id
+        self.autonomy_channel_ids = autonomy_channel_ids
+        self.restricted_channel_ids = restricted_channel_ids
+        self.verified_role_id = verified_role_id
+        self.unverified_role_id = unverified_role_id
+
+    @staticmethod
+    def _parse_channel_ids(raw: Optional[str]) -> List[int]:
+        if not raw:
+            return []
+        try:
+            return [int(cid) for cid in json.loads(raw)]
+        except (json.JSONDecodeError, TypeError, ValueError):
+            logger.error(f"Malformed channel list in server config: {raw!r}")
+            return []
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "GuildConfig":
+        guild_id, autonomy_channels, restricted_channels, verified_role_id, unverified_role_id = row
+        return cls(
+            guild_id,
+            autonomy_channel_ids=tuple(cls._parse_channel_ids(autonomy_channels)),
+            restricted_channel_ids=frozenset(cls._parse_channel_ids(restricted_channels)),
+            verified_role_id=verified_role_id,
+            unverified_role_id=unverified_role_id,
+        )
+
+
+GUILD_CONFIG_COLUMNS = "guild_id, autonomy_channels, restricted_channels, verified_role_id, unverified_role_id"
+
+# In-memory mirror of `server_configs`. Once `load_all_guild_configs` has run, a guild
+# missing from this dict has no row in the table, so lookups never need to hit the database.
+_guild_configs: Dict[int, GuildConfig] = {}
+_guild_configs_loaded = False
+# Bumped by every invalidation, so a reader that raced with a write can tell its row is stale.
+_guild_config_generations: Dict[int, int] = {}
+_guild_config_lock = threading.Lock()
+
+
+def load_all_guild_configs():
+    """Loads every row of `server_configs` into the in-memory cache."""
+    global _guild_configs_loaded
+    rows = db_manager.execute(f"SELECT {GUILD_CONFIG_COLUMNS} FROM server_configs", fetch="all")
+    if rows is None:
+        logger.error("Could not load server configs into memory. Falling back to per-guild lookups.")
+        return
+    _guild_configs.clear()
+    _guild_configs.update((row[0], GuildConfig.from_row(row)) for row in rows)
+    _guild_configs_loaded = True
+    logger.info(f"Loaded {len(rows)} server config(s) into memory.")
+
+
+def peek_guild_config(guild_id: int) -> Optional[GuildConfig]:
+    """Returns the cached config for a guild without touching the database, or None on a cache miss."""
+    config = _guild_configs.get(guild_id)
+    if config is None and _guild_configs_loaded:
+        config = _guild_configs.setdefault(guild_id, GuildConfig(guild_id))
+    return config
+
+
+def get_guild_config(guild_id: int) -> GuildConfig:
+    """Gets the pre-parsed configuration for a server, loading it into the cache on a miss."""
+    config = peek_guild_config(guild_id)
+    if config is not None:
+        return config
+    generation = _guild_config_generations.get(guild_id, 0)
+    row = db_manager.execute(f"SELECT {GUILD_CONFIG_COLUMNS} FROM server_configs WHERE guild_id = ?",
+                             (guild_id,), fetch="one")
+    config = GuildConfig.from_row(row) if row else GuildConfig(guild_id)
+    _store_guild_config(guild_id, config, generation)
+    return config
+
+
+def _store_guild_config(guild_id: int, config: GuildConfig, generation: int):
+    """Caches a config read at `generation`, unless the guild was invalidated while it was being read."""
+    with _guild_config_lock:
+        if _guild_config_generations.get(guild_id, 0) == generation:
+            _guild_configs[guild_id] = config
+
+
+def invalidate_guild_config(guild_id: int):
+    """Drops a guild's cached config and reloads it from the database."""
+    with _guild_config_lock:
+        generation = _guild_config_generations.get(guild_id, 0) + 1
+        _guild_config_generations[guild_id] = generation
+        _guild_configs.pop(guild_id, None)
+    row = db_manager.execute(f"SELECT {GUILD_CONFIG_COLUMNS} FROM server_configs WHERE guild_id = ?",
+                             (guild_id,), fetch="one")
+    if row:
+        _store_guild_config(guild_id, GuildConfig.from_row(row), generation)
+
+
 def get_server_config_value(guild_id: int, key: str) -> Optional[Any]:
     """Gets a specific configuration value for a server."""
     sql = f"SELECT {key} FROM server_configs WHERE guild_id = ?"
@@ -224,6 +819,7 @@ def set_server_config_value(guild_id: int, key: str, value: Any):
 
     update_sql = f"UPDATE server_configs SET {key} = ? WHERE guild_id = ?"
     db_manager.execute(update_sql, (value, guild_id))
+    invalidate_guild_config(guild_id)
     logger.info(f"Updated server config for guild {guild_id}: set {key} to {value}")
 
 
@@ -0,0 +1,146 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/discord_api.py
+
+import asyncio
+import logging
+from typing import Optional, Any, Mapping
+
+import aiohttp
+
+from data.session_manager import SessionManager, get_client_timeout
+
+logger = logging.getLogger('demented_bot.discord_api')
+
+DISCORD_API_URL = "https://discord.com/api/v10"
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF_BASE = 0.5  # seconds, doubled after each failed attempt
+
+
+class DiscordAPIResponse:
+    """The parts of a Discord REST response the bot cares about, read fully before the connection is released."""
+    __slots__ = ("status", "headers", "data")
+
+    def __init__(self, status: int, headers: Mapping[str, str], data: Any):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def __repr__(self):
+        return f"<DiscordAPIResponse status={self.status} data={self.data!r}>"
+
+
+class RateLimiter:
+    """
+    Paces requests to a single Discord rate-limit bucket using the X-RateLimit-* headers
+    on its responses, instead of sleeping a fixed amount between requests.
+
+    Callers `acquire` before each request; once the bucket reports no remaining requests,
+    further callers wait until it resets. A 429 pushes everyone back by its retry_after.
+    """
+
+    def __init__(self):
+        self._remaining: Optional[int] = None
+        self._reset_at = 0.0
+        self._paused_until = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self._remaining is None or now >= self._reset_at:
+                # Unknown or already reset: let the request through and learn from its headers.
+                self._remaining = None
+                return
+            if self._remaining > 0:
+                self._remaining -= 1
+                return
+            await asyncio.sleep(self._reset_at - now)
+
+    def update(self, headers: Mapping[str, str]):
+        """Records the bucket state reported by a response."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is None or reset_after is None:
+            return
+        try:
+            self._remaining = int(remaining)
+            self._reset_at = asyncio.get_running_loop().time() + float(reset_after)
+        except ValueError:
+            logger.debug(f"Ignoring malformed rate-limit headers: {remaining!r}, {reset_after!r}")
+
+    def pause(self, seconds: float):
+        """Holds back every caller for `seconds`, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, asyncio.get_running_loop().time() + seconds)
+
+
+def _retry_after(response: DiscordAPIResponse) -> float:
+    """Seconds to wait before retrying a 429, from the JSON body or the Retry-After header."""
+    if isinstance(response.data, dict) and "retry_after" in response.data:
+        return float(response.data["retry_after"])
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+async def discord_request(method: str, url: str, *, headers: Optional[dict] = None, data: Optional[dict] = None,
+                          json: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT,
+                          retries: int = DEFAULT_RETRIES, idempotent: bool = True,
+                          rate_limiter: Optional[RateLimiter] = None) -> Optional[DiscordAPIResponse]:
+    """
+    Sends a request to the Discord REST API over the shared 'discord' session.
+
+    Connection errors, timeouts and 5xx responses are retried with exponential backoff,
+    and 429 responses are retried after the delay Discord asks for. Any other response,
+    successful or not, is returned as-is. Returns None if every attempt failed.
+    Pass `idempotent=False` for requests that must not be sent twice (e.g. a refresh token
+    grant, which rotates the token): then only 429s, which Discord never processed, are retried.
+    If a `rate_limiter` is given, every attempt waits on it and feeds its headers back.
+    """
+    session = SessionManager.get_session("discord")
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        try:
+            async with session.request(method, url, headers=headers, data=data, json=json,
+                                       timeout=get_client_timeout(timeout)) as resp:
+                try:
+                    body = await resp.json(content_type=None)
+                except ValueError:
+                    body = await resp.text()
+                # Copy as a case-insensitive multidict; Discord's header casing is not guaranteed.
+                response = DiscordAPIResponse(resp.status, resp.headers.copy(), body)
+            if rate_limiter is not None:
+                rate_limiter.update(response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == retries or not idempotent:
+                logger.error(f"Discord API {method} {url} failed after {attempt + 1} attempt(s): {e!r}")
+                return None
+            delay = RETRY_BACKOFF_BASE * (2 ** attempt)
+            logger.warning(f"Discord API {method} {url} failed ({e!r}). Retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status == 429 and attempt < retries:
+            delay = _retry_after(response)
+            logger.warning(f"Rate limited on {method} {url}. Retrying in {delay:.2f}s.")
+            if rate_limiter is not None:
+                rate_limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            continue
+        if response.status >= 500 and attempt < retries and idempotent:
+            delay = RETRY_BACKOFF_BASE * (2 ** attempt)
+            logger.warning(f"Discord API {method} {url} returned {response.status}. Retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            continue
+        return response
+    return None
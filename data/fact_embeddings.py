@@ -0,0 +1,168 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/fact_embeddings.py
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from data import database_manager as dbm
+from data.async_database import async_db
+
+# --- NumPy for vector search ---
+try:
+    import numpy as np
+
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+# --- transformers/torch for sentence embeddings ---
+try:
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    transformers_available = True
+except ImportError:
+    transformers_available = False
+
+logger = logging.getLogger('demented_bot.fact_embeddings')
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_TOKENS = 128
+BACKFILL_BATCH_SIZE = 64
+
+
+def encode_vector(vector: "np.ndarray") -> bytes:
+    """Packs a vector as float16 bytes, half the size of float32 with no noticeable loss in ranking."""
+    return vector.astype(np.float16).tobytes()
+
+
+def decode_vectors(blobs: Sequence[bytes]) -> "np.ndarray":
+    """Unpacks float16 vectors into one float32 matrix with a row per vector."""
+    return np.frombuffer(b"".join(blobs), dtype=np.float16).reshape(len(blobs), -1).astype(np.float32)
+
+
+def top_k_per_group(scores: "np.ndarray", groups: "np.ndarray", k: int, min_score: float = -1.0) -> Dict[int, "np.ndarray"]:
+    """
+    For each distinct value in `groups`, returns the row indices of its `k` best scores,
+    best first, leaving out any below `min_score`.
+    """
+    results = {}
+    order = np.argsort(groups, kind="stable")
+    unique_groups, starts = np.unique(groups[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    for group, start, end in zip(unique_groups, starts, ends):
+        rows = order[start:end]
+        group_scores = scores[rows]
+        if len(rows) > k:
+            best = np.argpartition(-group_scores, k)[:k]
+            rows, group_scores = rows[best], group_scores[best]
+        ranked = rows[np.argsort(-group_scores)]
+        results[int(group)] = ranked[scores[ranked] >= min_score]
+    return results
+
+
+class FactEmbeddingIndex:
+    """
+    Picks the facts most relevant to the current message instead of just the newest ones.
+
+    Facts are embedded with a local sentence-transformer model in the background. This covers
+    existing facts at startup and new ones whenever `schedule_backfill` is called after adding
+    a fact. The vectors are stored as float16 blobs in the fact_embeddings table. A query embeds
+    the message once, scores every fact of the relevant users with a single matrix product and
+    keeps the top k per user.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, min_score: float = 0.2):
+        self.model_name = model_name
+        self.min_score = min_score
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fact-embeddings")
+        self._tokenizer = None
+        self._model = None
+        self._failed = False
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._backfill_requested = False
+
+    @property
+    def available(self) -> bool:
+        return numpy_available and transformers_available and not self._failed
+
+    def _load_model(self):
+        if self._model is None:
+            logger.info(f"Loading sentence embedding model '{self.model_name}'...")
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self._model = AutoModel.from_pretrained(self.model_name)
+            self._model.eval()
+
+    def _embed_blocking(self, texts: List[str]) -> "np.ndarray":
+        self._load_model()
+        encoded = self._tokenizer(texts, padding=True, truncation=True, max_length=MAX_TOKENS, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self._model(**encoded).last_hidden_state
+        # Mean-pool over real tokens, then normalize so a dot product is the cosine similarity.
+        mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.numpy().astype(np.float32)
+
+    async def embed(self, texts: List[str]) -> Optional["np.ndarray"]:
+        """Embeds texts on the embedding thread. Returns None, and disables the index, if the model fails."""
+        if not self.available:
+            return None
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._embed_blocking, texts)
+        except Exception as e:
+            logger.error(f"Sentence embedding failed; falling back to recent facts: {e}", exc_info=True)
+            self._failed = True
+            return None
+
+    def schedule_backfill(self):
+        """Starts embedding any facts that do not have a vector yet, or makes a running backfill take another pass."""
+        if not self.available:
+            return
+        self._backfill_requested = True
+        if self._backfill_task is None or self._backfill_task.done():
+            self._backfill_task = asyncio.get_running_loop().create_task(self._backfill())
+
+    async def _backfill(self):
+        total = 0
+        while self.available:
+            # A fact added after this read started sets the flag again, so an empty batch only ends
+            # the backfill if nothing was requested while it ran.
+            self._backfill_requested = False
+            rows = await async_db.read(dbm.get_facts_without_embeddings, self.model_name, BACKFILL_BATCH_SIZE)
+            if not rows:
+                if self._backfill_requested:
+                    continue
+                break
+            vectors = await self.embed([fact_text for _, _, fact_text in rows])
+            if vectors is None:
+                return
+            embeddings = [(fact_id, user_id, encode_vector(vector)) for (fact_id, user_id, _), vector in zip(rows, vectors)]
+            if not await async_db.write(dbm.store_fact_embeddings, self.model_name, embeddings):
+                return
+            total += len(rows)
+        if total:
+            logger.info(f"Embedded {total} fact(s) with '{self.model_name}'.")
+
+    async def get_relevant_facts(self, user_ids: List[int], query_text: str, k: int = 3) -> Dict[int, List[str]]:
+        """Returns up to `k` facts per user, most relevant to `query_text` first. Users with no embedded facts are left out."""
+        if not self.available or not user_ids or not query_text:
+            return {}
+        rows = await async_db.read(dbm.get_fact_embeddings, user_ids, self.model_name)
+        if not rows:
+            return {}
+        query = await self.embed([query_text])
+        if query is None:
+            return {}
+
+        matrix = decode_vectors([vector for _, _, vector in rows])
+        scores = matrix @ query[0]
+        groups = np.fromiter((user_id for user_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        best = top_k_per_group(scores, groups, k, self.min_score)
+        return {user_id: [rows[i][1] for i in indices] for user_id, indices in best.items() if len(indices)}
+
+    def shutdown(self):
+        if self._backfill_task is not None:
+            self._backfill_task.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,139 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/gemini_cache.py
+
+import asyncio
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from data.session_manager import SessionManager, get_client_timeout
+
+logger = logging.getLogger('demented_bot.gemini_cache')
+
+REQUEST_TIMEOUT = 15
+FAILURE_BACKOFF = 600  # seconds before retrying a prompt the API refused to cache
+DEFAULT_MIN_TOKENS = 1024  # smallest prompt Gemini 2.5 Flash accepts for cachedContents
+
+
+class _CachedPrompt:
+    __slots__ = ("name", "text", "expires_at")
+
+    def __init__(self, name: str, text: str, expires_at: float):
+        self.name = name
+        self.text = text
+        self.expires_at = expires_at
+
+
+class GeminiContextCache:
+    """
+    Keeps server-side Gemini cachedContents handles for the static system prompts, so each
+    request can reference a handle instead of re-uploading the persona text.
+
+    There is one handle per (model, variant). A handle is extended with a TTL update once it
+    comes within `refresh_margin` seconds of expiry, and recreated if that fails or the
+    prompt text changed. If the API refuses to cache a prompt (for example because it is below
+    the model's minimum cacheable size), that variant is not retried for FAILURE_BACKOFF seconds.
+    Prompts estimated below `min_tokens` are never sent for caching at all. Callers then fall
+    back to sending the prompt inline. A handle that is replaced is deleted right away rather
+    than left to expire.
+    """
+
+    def __init__(self, endpoint: str, api_key: str, ttl_seconds: int = 3600, refresh_margin: int = 300,
+                 min_tokens: int = DEFAULT_MIN_TOKENS):
+        self.endpoint = endpoint.rstrip('/')
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.min_tokens = min_tokens
+        self._handles: Dict[Tuple[str, str], _CachedPrompt] = {}
+        self._failed_until: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._pending_deletes: Set[asyncio.Task] = set()
+
+    def is_cacheable(self, prompt_tokens: int) -> bool:
+        """Whether a prompt of `prompt_tokens` (estimated) is large enough for the API to cache."""
+        return prompt_tokens >= self.min_tokens
+
+    async def get_handle(self, model: str, variant: str, system_prompt: str, prompt_tokens: int) -> Optional[str]:
+        """Returns a cachedContents name holding `system_prompt` for `model`, or None if caching is unavailable."""
+        if not self.is_cacheable(prompt_tokens):
+            return None
+        key = (model, variant)
+        now = asyncio.get_running_loop().time()
+        cached = self._handles.get(key)
+        if cached and cached.text == system_prompt and cached.expires_at - self.refresh_margin > now:
+            return cached.name
+        if self._failed_until.get(key, 0) > now:
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have refreshed the handle while this one waited.
+            cached = self._handles.get(key)
+            now = asyncio.get_running_loop().time()
+            if cached and cached.text == system_prompt and cached.expires_at - self.refresh_margin > now:
+                return cached.name
+
+            if cached and cached.text == system_prompt and cached.expires_at > now and await self._extend(cached):
+                return cached.name
+
+            if cached:
+                # Superseded by a new prompt text, or could not be extended.
+                self._discard(key)
+            name = await self._create(model, system_prompt)
+            if name is None:
+                self._failed_until[key] = now + FAILURE_BACKOFF
+                return None
+            self._handles[key] = _CachedPrompt(name, system_prompt, now + self.ttl_seconds)
+            logger.info(f"Created Gemini context cache '{name}' for {model} ({variant}).")
+            return name
+
+    def invalidate(self, model: str, variant: str):
+        """Forgets a handle, e.g. after a request that referenced it failed."""
+        self._discard((model, variant))
+
+    def _discard(self, key: Tuple[str, str]):
+        """Forgets a handle and deletes it server-side in the background, unless it already expired."""
+        cached = self._handles.pop(key, None)
+        if cached is not None and cached.expires_at > asyncio.get_running_loop().time():
+            task = asyncio.get_running_loop().create_task(self._delete(cached.name))
+            self._pending_deletes.add(task)
+            task.add_done_callback(self._pending_deletes.discard)
+
+    async def _create(self, model: str, system_prompt: str) -> Optional[str]:
+        body = {
+            "model": f"models/{model}",
+            "systemInstruction": {"parts": [{"text": system_prompt}]},
+            "ttl": f"{self.ttl_seconds}s",
+        }
+        data = await self._request("post", f"{self.endpoint}?key={self.api_key}", body)
+        return data.get("name") if isinstance(data, dict) else None
+
+    def _handle_url(self, name: str) -> str:
+        return f"{self.endpoint.rsplit('/cachedContents', 1)[0]}/{name}?key={self.api_key}"
+
+    async def _delete(self, name: str):
+        # Best effort: a handle that is already gone is fine, and anything left expires on its own.
+        if await self._request("delete", self._handle_url(name)) is not None:
+            logger.debug(f"Deleted Gemini context cache '{name}'.")
+
+    async def _extend(self, cached: _CachedPrompt) -> bool:
+        url = f"{self._handle_url(cached.name)}&updateMask=ttl"
+        if await self._request("patch", url, {"ttl": f"{self.ttl_seconds}s"}) is None:
+            return False
+        cached.expires_at = asyncio.get_running_loop().time() + self.ttl_seconds
+        logger.debug(f"Extended Gemini context cache '{cached.name}'.")
+        return True
+
+    async def _request(self, method: str, url: str, body: Optional[dict] = None) -> Optional[dict]:
+        session = SessionManager.get_session("gemini")
+        try:
+            async with session.request(method, url, json=body, timeout=get_client_timeout(REQUEST_TIMEOUT)) as resp:
+                if resp.status != 200:
+                    logger.warning(f"Gemini context cache {method.upper()} returned {resp.status}: "
+                                   f"{(await resp.text())[:300]}")
+                    return None
+                return await resp.json(content_type=None) or {}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"Gemini context cache {method.upper()} failed: {e!r}")
+            return None
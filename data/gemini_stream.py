@@ -0,0 +1,160 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/gemini_stream.py
+
+import asyncio
+import json
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import aiohttp
+import discord
+
+from data.session_manager import SessionManager, get_client_timeout
+
+logger = logging.getLogger('demented_bot.gemini_stream')
+
+STREAM_TIMEOUT = 120  # seconds for the whole streamed response
+DISCORD_MESSAGE_LIMIT = 2000
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class GeminiStreamError(Exception):
+    """Raised when streamGenerateContent answers with an error status."""
+
+
+async def _read_lines(content: aiohttp.StreamReader) -> AsyncIterator[bytes]:
+    """
+    Yields the lines of a response body. Unlike iterating the StreamReader directly, a line
+    longer than aiohttp's read buffer (64 KiB) is returned whole instead of raising ValueError.
+    """
+    buffer = b""
+    async for chunk in content.iter_any():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def stream_gemini_text(url: str, payload: dict, timeout: float = STREAM_TIMEOUT) -> AsyncIterator[str]:
+    """
+    POSTs to a `streamGenerateContent?alt=sse` URL and yields each piece of generated
+    text as it arrives.
+    """
+    session = SessionManager.get_session("gemini")
+    async with session.post(url, json=payload, timeout=get_client_timeout(timeout)) as resp:
+        if resp.status != 200:
+            body = await resp.text()
+            raise GeminiStreamError(f"HTTP {resp.status}: {body[:500]}")
+        async for raw_line in _read_lines(resp.content):
+            line = raw_line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                logger.warning(f"Skipping malformed stream event: {line[:200]!r}")
+                continue
+            candidates = event.get("candidates") or []
+            if not candidates:
+                continue
+            for part in candidates[0].get("content", {}).get("parts", []):
+                text = part.get("text")
+                if text:
+                    yield text
+
+
+def partial_json_string(raw: str, key: str) -> Optional[str]:
+    """
+    Decodes as much of the string value of `key` as has arrived so far in an incomplete
+    JSON object, e.g. the "response_text" of a structured reply that is still streaming.
+    Returns None until the value has started.
+    """
+    match = re.search(r'"' + re.escape(key) + r'"\s*:\s*"', raw)
+    if not match:
+        return None
+    chars = []
+    i, end = match.end(), len(raw)
+    while i < end:
+        char = raw[i]
+        if char == '"':
+            break
+        if char == '\\':
+            if i + 1 >= end:
+                break
+            escape = raw[i + 1]
+            if escape == 'u':
+                if i + 6 > end:
+                    break
+                try:
+                    chars.append(chr(int(raw[i + 2:i + 6], 16)))
+                except ValueError:
+                    break
+                i += 6
+                continue
+            chars.append(_JSON_ESCAPES.get(escape, escape))
+            i += 2
+            continue
+        chars.append(char)
+        i += 1
+    # Join \\uXXXX surrogate pairs and drop a half that has not fully arrived yet.
+    return "".join(chars).encode("utf-16", "surrogatepass").decode("utf-16", "ignore")
+
+
+class ProgressiveMessage:
+    """
+    Shows text that is still being generated in one Discord message. The message is sent as
+    soon as there is any text, then edited at most once every `min_interval` seconds to stay
+    well inside Discord's edit rate limits. `finish` always writes the final text.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[discord.Message]], min_interval: float = 1.0):
+        self._send = send
+        self.min_interval = min_interval
+        self.message: Optional[discord.Message] = None
+        self._shown = ""
+        self._last_update = 0.0
+
+    async def update(self, text: str):
+        """Shows `text` if it changed and the throttle allows it; otherwise it is skipped."""
+        text = text.strip()[:DISCORD_MESSAGE_LIMIT]
+        now = asyncio.get_running_loop().time()
+        if not text or text == self._shown or now - self._last_update < self.min_interval:
+            return
+        self._last_update = now
+        await self._show(text)
+
+    async def finish(self, text: str, notify: bool = False) -> Optional[discord.Message]:
+        """
+        Shows the final text, sending the message if nothing was shown yet. Discord does not
+        notify mentions added by an edit, so with `notify` a message that was already posted is
+        replaced by a new one instead.
+        """
+        text = text.strip()[:DISCORD_MESSAGE_LIMIT]
+        if notify and self.message is not None:
+            await self.discard()
+        if text != self._shown or self.message is None:
+            await self._show(text)
+        return self.message
+
+    async def discard(self):
+        """Deletes whatever was already posted, e.g. when the reply failed halfway."""
+        if self.message is None:
+            return
+        try:
+            await self.message.delete()
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to delete streamed message: {e}")
+        self.message, self._shown = None, ""
+
+    async def _show(self, text: str):
+        try:
+            if self.message is None:
+                self.message = await self._send(text)
+            else:
+                await self.message.edit(content=text)
+            self._shown = text
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to update streamed message: {e}")
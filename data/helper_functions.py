@@ -25,7 +25,7 @@ async def get_joke(bot: commands.Bot, category="Dark"):
     url = f"https://v2.jokeapi.dev/joke/{category}"
 
     # CORRECTED: Removed the invalid 'response_type' argument
-    data = await cached_http_get(url, ttl_seconds=3600, timeout=joke_api_timeout)
+    data = await cached_http_get(url, ttl_seconds=3600, timeout=joke_api_timeout, stale_while_revalidate=3600)
 
     if not data:
         fallback_jokes = [
@@ -52,7 +52,7 @@ async def get_bored_activity(participants=1):
     params = {"participants": participants}
 
     # CORRECTED: Removed the invalid 'response_type' argument
-    data = await cached_http_get(url, params=params, ttl_seconds=300)
+    data = await cached_http_get(url, params=params, ttl_seconds=300, stale_while_revalidate=600)
 
     if not data:
         fallback_activities = [
@@ -0,0 +1,75 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/line_pool.py
+
+import logging
+import random
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger('demented_bot.line_pool')
+
+NAME_PLACEHOLDER = "{name}"
+RECENT_LINES = 500  # served lines remembered so a regenerated duplicate is not served again
+
+
+class LinePools:
+    """
+    Pools of pre-generated short lines (greetings, insults...), one pool per kind.
+
+    Lines are generated ahead of time in batches and served instantly, each at most once. A
+    line may contain "{name}", which is replaced with the user's name when it is served. New
+    lines are dropped if they duplicate one already pooled or one served recently.
+    """
+
+    def __init__(self, kinds: Iterable[str], max_size: int = 20, low_water: int = 5):
+        self.max_size = max_size
+        self.low_water = low_water
+        self._pools: Dict[str, List[str]] = {kind: [] for kind in kinds}
+        self._recent = deque(maxlen=RECENT_LINES)
+        self._recent_keys = set()
+        self.served = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(line: str) -> str:
+        return " ".join(line.lower().split())
+
+    def take(self, kind: str, user_name: str) -> Optional[str]:
+        """Removes and returns a random line of `kind` for `user_name`, or None if the pool is empty."""
+        pool = self._pools.get(kind)
+        if not pool:
+            self.misses += 1
+            return None
+        line = pool.pop(random.randrange(len(pool)))
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_keys.discard(self._recent[0])
+        key = self._key(line)
+        self._recent.append(key)
+        self._recent_keys.add(key)
+        self.served += 1
+        return line.replace(NAME_PLACEHOLDER, user_name)
+
+    def add(self, kind: str, lines: Iterable[str]) -> int:
+        """Adds generated lines to a pool, up to its size, skipping duplicates. Returns how many were added."""
+        pool = self._pools.setdefault(kind, [])
+        pooled = {self._key(line) for line in pool}
+        added = 0
+        for line in lines:
+            if len(pool) >= self.max_size:
+                break
+            if not isinstance(line, str) or not line.strip():
+                continue
+            key = self._key(line)
+            if key in pooled or key in self._recent_keys:
+                continue
+            pool.append(line.strip())
+            pooled.add(key)
+            added += 1
+        return added
+
+    def needs_refill(self) -> List[str]:
+        """Kinds whose pool has dropped below the low-water mark, emptiest first."""
+        return sorted((kind for kind, pool in self._pools.items() if len(pool) < self.low_water),
+                      key=lambda kind: len(self._pools[kind]))
+
+    def sizes(self) -> Dict[str, int]:
+        return {kind: len(pool) for kind, pool in self._pools.items()}
@@ -0,0 +1,69 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/message_tracker.py
+
+import logging
+from collections import OrderedDict, deque
+from typing import Optional
+
+import discord
+
+logger = logging.getLogger('demented_bot.message_tracker')
+
+MESSAGES_PER_CHANNEL = 100
+MAX_CHANNELS = 2000
+
+
+class _ChannelRing:
+    __slots__ = ("ids", "members", "floor")
+
+    def __init__(self, maxlen: int, floor: int):
+        self.ids = deque(maxlen=maxlen)
+        self.members = set()
+        # Every bot message in this channel with an ID above `floor` is (or was) in the ring.
+        self.floor = floor
+
+
+class BotMessageTracker:
+    """
+    Remembers the IDs of the bot's most recent messages in each channel, so checking whether
+    a reply targets the bot is a set lookup instead of a REST call.
+
+    Tracking starts when the tracker is created. Each channel keeps a floor: a message newer
+    than the floor that is not in the ring was not sent by the bot. A message at or below the
+    floor is unknown, because it was sent before tracking started or was evicted from the ring.
+    Channels themselves are evicted least-recently-used once there are more than `max_channels`.
+    After that, untracked channels are only known from the time of the eviction onwards.
+    """
+
+    def __init__(self, per_channel: int = MESSAGES_PER_CHANNEL, max_channels: int = MAX_CHANNELS):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self._default_floor = discord.utils.time_snowflake(discord.utils.utcnow())
+        self._channels: "OrderedDict[int, _ChannelRing]" = OrderedDict()
+
+    def add(self, channel_id: int, message_id: int):
+        """Records a message the bot sent."""
+        ring = self._channels.get(channel_id)
+        if ring is None:
+            ring = _ChannelRing(self.per_channel, self._default_floor)
+            self._channels[channel_id] = ring
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+                self._default_floor = discord.utils.time_snowflake(discord.utils.utcnow())
+        else:
+            self._channels.move_to_end(channel_id)
+
+        if len(ring.ids) == ring.ids.maxlen:
+            evicted = ring.ids[0]
+            ring.members.discard(evicted)
+            ring.floor = max(ring.floor, evicted)
+        ring.ids.append(message_id)
+        ring.members.add(message_id)
+
+    def is_bot_message(self, channel_id: int, message_id: int) -> Optional[bool]:
+        """Returns True or False when the answer is known, or None if the message predates what is tracked."""
+        ring = self._channels.get(channel_id)
+        if ring is None:
+            return False if message_id > self._default_floor else None
+        if message_id in ring.members:
+            return True
+        return False if message_id > ring.floor else None
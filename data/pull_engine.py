@@ -0,0 +1,104 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/pull_engine.py
+
+import asyncio
+import logging
+from typing import Dict, List, Tuple, Optional, Callable, Awaitable
+
+from data.discord_api import discord_request, RateLimiter, DISCORD_API_URL
+from data.async_database import record_pull_all_results
+
+logger = logging.getLogger('demented_bot.pull_engine')
+
+ProgressCallback = Callable[[int, int, Dict[str, int]], Awaitable[None]]
+
+
+class PullAllEngine:
+    """
+    Adds previously authorized users to a guild through the Discord REST API.
+
+    A fixed number of worker coroutines take users from a shared iterator and share one
+    RateLimiter for the guild's add-member bucket. That limiter paces them from Discord's
+    X-RateLimit-* headers and 429 retry_after values. Each outcome is written back to the
+    pull-all checkpoint in batches, so an interrupted run can resume from the users still
+    marked pending.
+    """
+
+    def __init__(self, guild_id: int, bot_token: str, access_tokens: Dict[int, str], concurrency: int = 4,
+                 checkpoint_batch: int = 25, progress_callback: Optional[ProgressCallback] = None,
+                 progress_interval: float = 5.0):
+        self.guild_id = guild_id
+        self.access_tokens = access_tokens
+        self.concurrency = max(1, concurrency)
+        self.checkpoint_batch = checkpoint_batch
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.rate_limiter = RateLimiter()
+        self.headers = {'Authorization': f'Bot {bot_token}', 'Content-Type': 'application/json'}
+        self.counts = {"added": 0, "failed": 0, "skipped": 0}
+        self._unsaved_results: List[Tuple[int, str]] = []
+        self._total = 0
+        self._last_progress = 0.0
+
+    @property
+    def processed(self) -> int:
+        return sum(self.counts.values())
+
+    async def run(self, user_ids: List[int]) -> Dict[str, int]:
+        """Pulls every user in `user_ids` and returns how many were added, failed or skipped."""
+        self._total = len(user_ids)
+        if not user_ids:
+            return self.counts
+
+        pending = iter(user_ids)
+        workers = [asyncio.create_task(self._worker(pending))
+                   for _ in range(min(self.concurrency, len(user_ids)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            # Save whatever finished, even if the run was cancelled, so a resume does not repeat it.
+            await self._save_results()
+        return self.counts
+
+    async def _worker(self, pending):
+        for user_id in pending:
+            status = await self._pull_user(user_id)
+            self.counts[status] += 1
+            self._unsaved_results.append((user_id, status))
+            if len(self._unsaved_results) >= self.checkpoint_batch:
+                await self._save_results()
+            await self._report_progress()
+
+    async def _pull_user(self, user_id: int) -> str:
+        access_token = self.access_tokens.get(user_id)
+        if not access_token:
+            return "skipped"
+
+        url = f"{DISCORD_API_URL}/guilds/{self.guild_id}/members/{user_id}"
+        response = await discord_request('PUT', url, headers=self.headers, json={'access_token': access_token},
+                                         rate_limiter=self.rate_limiter)
+        if response and response.status in (201, 204):
+            logger.info(f"Pull-all: Successfully added user {user_id} to guild {self.guild_id}.")
+            return "added"
+        logger.warning(f"Pull-all: Failed to add user {user_id} to guild {self.guild_id}. Response: {response}")
+        return "failed"
+
+    async def _save_results(self):
+        if not self._unsaved_results:
+            return
+        batch, self._unsaved_results = self._unsaved_results, []
+        if not await record_pull_all_results(self.guild_id, batch):
+            logger.error(f"Pull-all: Could not checkpoint {len(batch)} result(s) for guild {self.guild_id}.")
+
+    async def _report_progress(self):
+        if self.progress_callback is None:
+            return
+        now = asyncio.get_running_loop().time()
+        if now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        try:
+            await self.progress_callback(self.processed, self._total, dict(self.counts))
+        except Exception as e:
+            logger.warning(f"Pull-all: Progress callback failed: {e}")
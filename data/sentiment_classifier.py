@@ -0,0 +1,221 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/sentiment_classifier.py
+
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+logger = logging.getLogger('demented_bot.sentiment_classifier')
+
+# torch/transformers are only imported inside the worker processes, which keeps them (and
+# their memory) out of the bot process. Here it is enough to know they are installed.
+transformers_available = (importlib.util.find_spec("torch") is not None
+                          and importlib.util.find_spec("transformers") is not None)
+
+DEFAULT_SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+DEFAULT_TOXICITY_MODEL = "unitary/toxic-bert"
+MAX_TOKENS = 128
+
+
+class MessageScore:
+    """
+    Classifier output for one message. `sentiment` runs from -1 (negative) to 1 (positive) and
+    `toxicity` from 0 to 1.
+    """
+    __slots__ = ("sentiment", "toxicity")
+
+    def __init__(self, sentiment: float, toxicity: float):
+        self.sentiment = sentiment
+        self.toxicity = toxicity
+
+    def sentiment_change(self, scale: float = 1.0) -> float:
+        """
+        The change to apply to a user's sentiment score for this message, from -0.5 to 1 before
+        `scale`: the same range as the fixed insult (-0.5) and compliment (+1) changes.
+        """
+        change = self.sentiment - self.toxicity  # -2 to 1
+        if change < 0:
+            change /= 4
+        return scale * change
+
+    def __repr__(self):
+        return f"MessageScore(sentiment={self.sentiment:.2f}, toxicity={self.toxicity:.2f})"
+
+
+# --- Worker process side ---
+# Each worker loads the models once in its initializer and keeps them for its lifetime.
+
+_worker_models = []
+
+
+def _load_classifier(model_name: str):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    torch.set_num_threads(1)  # one core per worker; the pool size sets the parallelism
+    return prepare_classifier(AutoTokenizer.from_pretrained(model_name),
+                              AutoModelForSequenceClassification.from_pretrained(model_name))
+
+
+def prepare_classifier(tokenizer, model):
+    """Puts a loaded tokenizer and sequence-classification model into the form `classify_batch` uses."""
+    model.eval()
+    labels = {index: label.lower() for index, label in model.config.id2label.items()}
+    multi_label = model.config.problem_type == "multi_label_classification" or "toxic" in labels.values()
+    return tokenizer, model, labels, multi_label
+
+
+def init_worker(sentiment_model: str, toxicity_model: str):
+    """Process pool initializer: loads the models and runs one inference so the first real batch is not slow."""
+    _worker_models.clear()
+    _worker_models.append(_load_classifier(sentiment_model))
+    _worker_models.append(_load_classifier(toxicity_model) if toxicity_model else None)
+    classify_batch(["warm-up"])
+
+
+def _predict(classifier, texts: List[str]):
+    import torch
+
+    tokenizer, model, labels, multi_label = classifier
+    encoded = tokenizer(texts, padding=True, truncation=True, max_length=MAX_TOKENS, return_tensors="pt")
+    with torch.inference_mode():
+        logits = model(**encoded).logits
+    probabilities = torch.sigmoid(logits) if multi_label else torch.softmax(logits, dim=-1)
+    return probabilities, labels
+
+
+def classify_batch(texts: List[str]) -> List[Tuple[float, float]]:
+    """Scores a batch of messages in the worker. Returns (sentiment, toxicity) per text."""
+    sentiment_model, toxicity_model = _worker_models
+
+    probabilities, labels = _predict(sentiment_model, texts)
+    positive = [i for i, label in labels.items() if label.startswith("pos")]
+    negative = [i for i, label in labels.items() if label.startswith("neg")]
+    sentiments = (probabilities[:, positive].sum(dim=1) - probabilities[:, negative].sum(dim=1)).tolist()
+
+    toxicities = [0.0] * len(texts)
+    if toxicity_model is not None:
+        probabilities, labels = _predict(toxicity_model, texts)
+        toxic = [i for i, label in labels.items() if "toxic" in label]
+        if toxic:
+            toxicities = probabilities[:, toxic].max(dim=1).values.tolist()
+    return list(zip(sentiments, toxicities))
+
+
+# --- Bot process side ---
+
+class SentimentClassifier:
+    """
+    Scores messages with a local sentiment and toxicity classifier, without an LLM round-trip.
+
+    Inference runs in a pool of worker processes, so it never holds the event loop or the GIL.
+    Each worker loads its models once at startup. Concurrent `classify` calls are grouped into
+    micro-batches: a batch is sent to a worker once it has `max_batch` messages or the first one
+    has waited `max_delay` seconds, whichever comes first. At most one batch per worker is in
+    flight; anything beyond that waits and joins the next batch.
+    """
+
+    def __init__(self, sentiment_model: str = DEFAULT_SENTIMENT_MODEL, toxicity_model: str = DEFAULT_TOXICITY_MODEL,
+                 workers: int = 1, max_batch: int = 32, max_delay: float = 0.015):
+        self.sentiment_model = sentiment_model
+        self.toxicity_model = toxicity_model
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.batches = 0
+        self.messages = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._failed = False
+
+    @property
+    def available(self) -> bool:
+        return transformers_available and not self._failed
+
+    def start(self):
+        """Starts the worker processes, which load their models in the background, and the batcher."""
+        if not self.available or self._executor is not None:
+            return
+        # "spawn" gives each worker a clean interpreter instead of a fork of the bot's threads.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker, initargs=(self.sentiment_model, self.toxicity_model)
+        )
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        # Workers are spawned on demand; submitting one no-op per worker starts them all now.
+        for _ in range(self.workers):
+            self._executor.submit(len, ())
+        logger.info(f"Starting {self.workers} classifier worker(s) with '{self.sentiment_model}'"
+                    f"{f' and {self.toxicity_model!r}' if self.toxicity_model else ''}.")
+
+    async def classify(self, text: str) -> Optional[MessageScore]:
+        """Scores one message. Returns None if the classifier is unavailable or failed."""
+        if not self.available or self._queue is None or not text:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._in_flight.acquire()
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            task = loop.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            scores = await asyncio.get_running_loop().run_in_executor(
+                self._executor, classify_batch, [text for text, _ in batch])
+            results = [MessageScore(sentiment, toxicity) for sentiment, toxicity in scores]
+            self.batches += 1
+            self.messages += len(batch)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            # A broken pool (e.g. a model that fails to download) would fail every later batch too.
+            logger.error(f"Message classifier failed; falling back to fixed sentiment changes: {e!r}")
+            self._failed = True
+            results = [None] * len(batch)
+        finally:
+            self._in_flight.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def shutdown(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        for task in self._batch_tasks:
+            task.cancel()
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait()[1].cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
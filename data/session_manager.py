@@ -1,132 +1,301 @@
 import aiohttp
 import asyncio
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger('demented_bot.session')
 
-# Simple global session manager
+# Connector settings for each named session. Every value can be overridden per session
+# from the "HTTP_SETTINGS" section of config.json. Separate sessions get separate pools,
+# so slow public APIs can never use up the connections that AI requests depend on.
+DEFAULT_CONNECTOR_PROFILES = {
+    "default": {               # Public APIs: jokes, memes, games, etc.
+        "LIMIT": 64,
+        "LIMIT_PER_HOST": 8,
+        "KEEPALIVE_TIMEOUT": 30,
+        "DNS_CACHE_TTL": 300,
+    },
+    "gemini": {                # Google Generative Language API
+        "LIMIT": 32,
+        "LIMIT_PER_HOST": 32,
+        "KEEPALIVE_TIMEOUT": 60,
+        "DNS_CACHE_TTL": 600,
+    },
+    "discord": {               # Discord REST calls made outside discord.py (OAuth2, member pulls)
+        "LIMIT": 16,
+        "LIMIT_PER_HOST": 16,
+        "KEEPALIVE_TIMEOUT": 60,
+        "DNS_CACHE_TTL": 600,
+    },
+}
+
+
+@lru_cache(maxsize=32)
+def get_client_timeout(total: float) -> aiohttp.ClientTimeout:
+    """Returns a shared ClientTimeout for the given total, instead of building one per request."""
+    return aiohttp.ClientTimeout(total=total)
+
+
+# Global manager for named, pooled HTTP sessions
 class SessionManager:
-    session = None
-    
+    sessions = {}
+    profiles = {name: dict(profile) for name, profile in DEFAULT_CONNECTOR_PROFILES.items()}
+
     @classmethod
-    def get_session(cls):
-        """Get a shared aiohttp ClientSession, creating it if needed."""
-        if cls.session is None or cls.session.closed:
-            cls.session = aiohttp.ClientSession()
-            logger.info("Created new shared HTTP session")
-        return cls.session
+    def configure(cls, settings):
+        """Applies the "HTTP_SETTINGS" section of config.json. Only affects sessions created afterwards."""
+        for name, overrides in settings.items():
+            profile = cls.profiles.setdefault(name, dict(DEFAULT_CONNECTOR_PROFILES["default"]))
+            profile.update(overrides)
+
+    @classmethod
+    def _create_connector(cls, name):
+        profile = cls.profiles.get(name, cls.profiles["default"])
+        # aiohttp never pipelines requests on a connection; idle keep-alive connections are
+        # reused one request at a time, which is safe against any HTTP/1.1 server.
+        return aiohttp.TCPConnector(
+            limit=profile["LIMIT"],
+            limit_per_host=profile["LIMIT_PER_HOST"],
+            keepalive_timeout=profile["KEEPALIVE_TIMEOUT"],
+            ttl_dns_cache=profile["DNS_CACHE_TTL"],
+            use_dns_cache=True,
+            force_close=False,
+        )
+
+    @classmethod
+    def get_session(cls, name="default"):
+        """Get a shared aiohttp ClientSession for the named pool, creating it if needed."""
+        session = cls.sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=cls._create_connector(name))
+            cls.sessions[name] = session
+            logger.info(f"Created new shared HTTP session '{name}'")
+        return session
+
+    @classmethod
+    def get_pool_stats(cls):
+        """Reports connection pool usage for each open session."""
+        stats = {}
+        for name, session in cls.sessions.items():
+            if session.closed:
+                continue
+            connector = session.connector
+            # aiohttp does not expose pool usage publicly, so read its bookkeeping defensively.
+            stats[name] = {
+                "limit": connector.limit,
+                "limit_per_host": connector.limit_per_host,
+                "in_use": len(getattr(connector, "_acquired", ())),
+                "idle": sum(len(conns) for conns in getattr(connector, "_conns", {}).values()),
+                "waiting": sum(len(waiters) for waiters in getattr(connector, "_waiters", {}).values()),
+            }
+        return stats
     
     @classmethod
     async def close(cls):
-        """Close the shared session if it exists."""
-        if cls.session and not cls.session.closed:
-            await cls.session.close()
-            cls.session = None
-            logger.info("Closed shared HTTP session")
+        """Close all shared sessions."""
+        for name, session in list(cls.sessions.items()):
+            if not session.closed:
+                await session.close()
+                logger.info(f"Closed shared HTTP session '{name}'")
+        cls.sessions.clear()
 
 # Imports for caching
+import heapq
+import itertools
+import sys
+import threading
 import time
-from datetime import datetime, timedelta
-from functools import lru_cache
+from collections import OrderedDict
+
+
+class BoundedCache:
+    """A sharded LRU cache with per-entry TTL, bounded by entry count and approximate size in bytes.
+
+    Keys are spread over independent shards, each with its own lock, its own share of the
+    limits, an LRU-ordered dict of entries and a min-heap of expiry times. Expired entries
+    are popped off the heap on every access, so no full scan is ever needed.
+    """
+
+    class _Shard:
+        __slots__ = ("lock", "entries", "expiry_heap", "bytes")
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.entries = OrderedDict()  # key -> (data, fresh_until, expiry, size), least recently used first
+            self.expiry_heap = []         # (expiry, sequence, key); may hold stale items for overwritten keys
+            self.bytes = 0
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, shard_count=8):
+        self.shard_count = max(1, int(shard_count))
+        self.max_entries_per_shard = max(1, int(max_entries) // self.shard_count)
+        self.max_bytes_per_shard = max(1, int(max_bytes) // self.shard_count)
+        self._shards = [self._Shard() for _ in range(self.shard_count)]
+        self._sequence = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _shard_for(self, key):
+        return self._shards[hash(key) % self.shard_count]
+
+    @staticmethod
+    def _estimate_size(data):
+        if isinstance(data, (str, bytes, bytearray)):
+            return len(data)
+        return sys.getsizeof(data)
+
+    def _remove(self, shard, key):
+        size = shard.entries.pop(key)[3]
+        shard.bytes -= size
+
+    def _expire(self, shard, now):
+        """Drops every entry whose TTL has passed. Caller must hold the shard lock."""
+        heap = shard.expiry_heap
+        while heap and heap[0][0] <= now:
+            expiry, _, key = heapq.heappop(heap)
+            entry = shard.entries.get(key)
+            # Skip heap items left behind when a key was overwritten with a new expiry.
+            if entry is not None and entry[2] == expiry:
+                self._remove(shard, key)
+                self.expirations += 1
+        # Rebuild the heap if stale items from overwrites start to dominate it.
+        if len(heap) > 2 * len(shard.entries) + 64:
+            shard.expiry_heap = [(entry[2], next(self._sequence), k) for k, entry in shard.entries.items()]
+            heapq.heapify(shard.expiry_heap)
+
+    def get(self, key):
+        """Get an item if it exists and is still fresh, marking it as recently used."""
+        shard = self._shard_for(key)
+        now = time.monotonic()
+        with shard.lock:
+            self._expire(shard, now)
+            entry = shard.entries.get(key)
+            if entry is None or now >= entry[1]:
+                self.misses += 1
+                return None
+            shard.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
 
-# Simple time-based caching for API requests
+    def get_stale(self, key):
+        """Get an item whose TTL has passed but which is still inside its stale window, or None."""
+        shard = self._shard_for(key)
+        now = time.monotonic()
+        with shard.lock:
+            self._expire(shard, now)
+            entry = shard.entries.get(key)
+            if entry is None or now < entry[1]:
+                return None
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, data, ttl_seconds=3600, size=None, stale_seconds=0):
+        """Store an item with an expiration time, evicting least recently used entries if over budget.
+
+        The item stops being returned by `get` after `ttl_seconds`, but is kept for another
+        `stale_seconds` so `get_stale` can serve it while a refresh is in progress.
+        """
+        if size is None:
+            size = self._estimate_size(data)
+        shard = self._shard_for(key)
+        if size > self.max_bytes_per_shard:
+            logger.debug(f"Not caching {key}: {size} bytes exceeds the per-shard budget")
+            return
+        now = time.monotonic()
+        fresh_until = now + ttl_seconds
+        expiry = fresh_until + stale_seconds
+        with shard.lock:
+            self._expire(shard, now)
+            if key in shard.entries:
+                self._remove(shard, key)
+            shard.entries[key] = (data, fresh_until, expiry, size)
+            shard.bytes += size
+            heapq.heappush(shard.expiry_heap, (expiry, next(self._sequence), key))
+            while len(shard.entries) > self.max_entries_per_shard or shard.bytes > self.max_bytes_per_shard:
+                oldest_key = next(iter(shard.entries))
+                self._remove(shard, oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry. Returns how many were removed."""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                removed += len(shard.entries)
+                shard.entries.clear()
+                shard.expiry_heap.clear()
+                shard.bytes = 0
+        return removed
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and current usage."""
+        return {
+            "entries": sum(len(shard.entries) for shard in self._shards),
+            "bytes": sum(shard.bytes for shard in self._shards),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Process-wide cache for API requests
 class SimpleCache:
-    cache = {}
-    _last_cleanup = time.monotonic()  # Use monotonic time for expirations
-    _cleanup_interval = 300  # Cleanup every 5 minutes
-    
+    _store = BoundedCache()
+
+    @classmethod
+    def configure(cls, settings):
+        """Rebuilds the cache from the "CACHE_SETTINGS" section of config.json (drops existing entries)."""
+        cls._store = BoundedCache(
+            max_entries=settings.get("MAX_ENTRIES", 1024),
+            max_bytes=settings.get("MAX_BYTES", 32 * 1024 * 1024),
+            shard_count=settings.get("SHARDS", 8),
+        )
+        logger.info(f"HTTP cache configured: {cls._store.max_entries_per_shard * cls._store.shard_count} entries, "
+                    f"{cls._store.max_bytes_per_shard * cls._store.shard_count} bytes, {cls._store.shard_count} shards")
+
     @classmethod
     def get(cls, key):
-        """Get an item from cache if it exists and is not expired.
-        Will periodically clean expired items to prevent memory leaks.
-        """
-        # Occasionally clean expired entries
-        now = time.monotonic()
-        if now - cls._last_cleanup > cls._cleanup_interval:
-            cls._clear_expired_entries()
-            cls._last_cleanup = now
-            
-        # Check if key exists and is not expired
-        if key in cls.cache:
-            data, expiry = cls.cache[key]
-            if now < expiry:
-                return data
-            # Remove expired item
-            del cls.cache[key]
-        return None
-    
+        """Get an item from cache if it exists and is not expired."""
+        return cls._store.get(key)
+
     @classmethod
-    def set(cls, key, data, ttl_seconds=3600):
-        """Store an item in cache with expiration time."""
-        expiry = time.monotonic() + ttl_seconds  # More efficient than datetime
-        cls.cache[key] = (data, expiry)
-    
+    def get_stale(cls, key):
+        """Get an expired item that is still within its stale-while-revalidate window."""
+        return cls._store.get_stale(key)
+
     @classmethod
-    def _clear_expired_entries(cls):
-        """Remove all expired items from cache."""
-        now = time.monotonic()
-        expired_keys = [k for k, (_, exp) in cls.cache.items() if now >= exp]
-        for key in expired_keys:
-            del cls.cache[key]
-        if expired_keys:
-            logger.debug(f"Cleared {len(expired_keys)} expired cache items")
-    
+    def set(cls, key, data, ttl_seconds=3600, size=None, stale_seconds=0):
+        """Store an item in cache with expiration time. `size` is the payload size in bytes, if known."""
+        cls._store.set(key, data, ttl_seconds, size, stale_seconds)
+
+    @classmethod
+    def stats(cls):
+        """Get hit/miss/eviction counters for the cache."""
+        return cls._store.stats()
+
     @classmethod
     def clear_all(cls):
         """Clear all cached entries."""
-        size = len(cls.cache)
-        cls.cache.clear()
+        size = cls._store.clear()
         logger.debug(f"Cleared all {size} cache entries")
 
-# Enhanced HTTP fetch with caching
-async def cached_http_get(url, params=None, ttl_seconds=3600, method="get", json_data=None, headers=None, timeout=10):
-    """Make an HTTP request with caching support.
-    
-    Args:
-        url: The URL to request
-        params: Optional query parameters
-        ttl_seconds: How long to cache results (0 to disable)
-        method: HTTP method to use ('get', 'post', etc)
-        json_data: JSON data for POST requests
-        headers: Request headers
-        timeout: Request timeout in seconds
-        
-    Returns:
-        Response data, or None if request failed
-    """
-    # Skip cache for non-GET requests
-    use_cache = ttl_seconds > 0 and method.lower() == 'get'
-    
-    # Generate cache key (only for cacheable requests)
-    if use_cache:
-        # Create a more compact key
-        param_str = '-'.join(f"{k}:{v}" for k, v in sorted(params.items())) if params else ""
-        cache_key = f"{url}:{param_str}"
-        
-        # Try cache first
-        cached_data = SimpleCache.get(cache_key)
-        if cached_data is not None:
-            logger.debug(f"Cache hit for {url}")
-            return cached_data
-    
+# Requests currently on the wire, keyed by cache key, so concurrent callers can share them.
+_inflight_requests = {}
+
+
+async def _fetch(url, method, kwargs, session_name="default", cache_key=None, ttl_seconds=0, stale_seconds=0):
+    """Performs a single HTTP request, caching the result under `cache_key` if one is given."""
     # Get shared session
-    session = SessionManager.get_session()
+    session = SessionManager.get_session(session_name)
     
     try:
         # Make the request
         request_method = getattr(session, method.lower())
         
-        # Build request kwargs
-        kwargs = {
-            'timeout': aiohttp.ClientTimeout(total=timeout)
-        }
-        if params:
-            kwargs['params'] = params
-        if json_data:
-            kwargs['json'] = json_data
-        if headers:
-            kwargs['headers'] = headers
-        
         # Execute request
         async with request_method(url, **kwargs) as response:
             # Handle non-200 status
@@ -135,14 +304,15 @@ async def cached_http_get(url, params=None, ttl_seconds=3600, method="get", json
                 return None
                 
             # Try to parse JSON, fall back to text
+            body = await response.read()
             try:
                 data = await response.json()
             except aiohttp.ContentTypeError:
                 data = await response.text()
             
             # Cache the result if appropriate
-            if use_cache:
-                SimpleCache.set(cache_key, data, ttl_seconds)
+            if cache_key is not None:
+                SimpleCache.set(cache_key, data, ttl_seconds, size=len(body), stale_seconds=stale_seconds)
                 
             return data
                 
@@ -151,4 +321,84 @@ async def cached_http_get(url, params=None, ttl_seconds=3600, method="get", json
         return None
     except Exception as e:
         logger.error(f"Unexpected error fetching {url}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _start_shared_fetch(cache_key, url, method, kwargs, session_name, ttl_seconds, stale_seconds):
+    """Starts a fetch that any number of callers can await, and registers it as in flight."""
+    task = asyncio.create_task(_fetch(url, method, kwargs, session_name, cache_key, ttl_seconds, stale_seconds))
+    _inflight_requests[cache_key] = task
+    task.add_done_callback(lambda _: _inflight_requests.pop(cache_key, None))
+    return task
+
+
+# Enhanced HTTP fetch with caching
+async def cached_http_get(url, params=None, ttl_seconds=3600, method="get", json_data=None, headers=None, timeout=10,
+                          stale_while_revalidate=0, session_name="default"):
+    """Make an HTTP request with caching support.
+    
+    Concurrent cacheable requests for the same key share a single in-flight request
+    instead of each going to the network.
+    
+    Args:
+        url: The URL to request
+        params: Optional query parameters
+        ttl_seconds: How long to cache results (0 to disable)
+        method: HTTP method to use ('get', 'post', etc)
+        json_data: JSON data for POST requests
+        headers: Request headers
+        timeout: Request timeout in seconds
+        stale_while_revalidate: For how many seconds past the TTL an expired result may still be
+            returned immediately while it is refreshed in the background (0 to disable)
+        session_name: Which pooled session to send the request through (see SessionManager)
+        
+    Returns:
+        Response data, or None if request failed
+    """
+    # Build request kwargs
+    kwargs = {
+        'timeout': get_client_timeout(timeout)
+    }
+    if params:
+        kwargs['params'] = params
+    if json_data:
+        kwargs['json'] = json_data
+    if headers:
+        kwargs['headers'] = headers
+
+    # Skip cache for non-GET requests
+    use_cache = ttl_seconds > 0 and method.lower() == 'get'
+    if not use_cache:
+        return await _fetch(url, method, kwargs, session_name)
+
+    # Create a more compact key
+    param_str = '-'.join(f"{k}:{v}" for k, v in sorted(params.items())) if params else ""
+    cache_key = f"{url}:{param_str}"
+    
+    # Try cache first
+    cached_data = SimpleCache.get(cache_key)
+    if cached_data is not None:
+        logger.debug(f"Cache hit for {url}")
+        return cached_data
+
+    inflight = _inflight_requests.get(cache_key)
+
+    # Serve an expired entry right away and refresh it in the background
+    if stale_while_revalidate > 0:
+        stale_data = SimpleCache.get_stale(cache_key)
+        if stale_data is not None:
+            if inflight is None:
+                logger.debug(f"Serving stale cache for {url} while revalidating")
+                _start_shared_fetch(cache_key, url, method, kwargs, session_name, ttl_seconds,
+                                    stale_while_revalidate)
+            return stale_data
+
+    # Join a request that is already in flight rather than sending a duplicate
+    if inflight is None:
+        inflight = _start_shared_fetch(cache_key, url, method, kwargs, session_name, ttl_seconds,
+                                       stale_while_revalidate)
+    else:
+        logger.debug(f"Joining in-flight request for {url}")
+
+    # Shield so one caller being cancelled does not cancel the request for the others
+    return await asyncio.shield(inflight)
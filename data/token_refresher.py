@@ -0,0 +1,93 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/token_refresher.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict
+
+from data.discord_api import discord_request, RateLimiter, DISCORD_API_URL
+from data.async_database import get_expiring_oauth_tokens, apply_oauth_token_refreshes
+
+logger = logging.getLogger('demented_bot.token_refresher')
+
+
+class TokenRefresher:
+    """
+    Keeps stored OAuth2 access tokens fresh so /verify pull and pull-all never hit Discord with an expired one.
+
+    Each pass finds tokens that expire within `refresh_window` seconds using the expires_at index
+    and works through them in batches. The requests in a batch run concurrently and share one
+    RateLimiter for the token endpoint. Each batch's results are saved in one transaction, and
+    tokens Discord reports as revoked (invalid_grant) are deleted.
+    """
+
+    def __init__(self, refresh_window: int = 86400, batch_size: int = 50, concurrency: int = 4):
+        self.refresh_window = refresh_window
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter()
+
+    async def run_once(self) -> Dict[str, int]:
+        """Refreshes every token nearing expiry and returns how many were refreshed, revoked or failed."""
+        counts = {"refreshed": 0, "revoked": 0, "failed": 0}
+        expiring = await get_expiring_oauth_tokens(int(time.time()) + self.refresh_window)
+        if not expiring:
+            return counts
+
+        logger.info(f"Refreshing {len(expiring)} OAuth token(s) that expire within {self.refresh_window}s.")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        for start in range(0, len(expiring), self.batch_size):
+            batch = expiring[start:start + self.batch_size]
+            results = await asyncio.gather(*(self._refresh(semaphore, user_id, refresh_token)
+                                             for user_id, refresh_token in batch))
+
+            refreshed = [result for result in results if isinstance(result, tuple)]
+            revoked = [token for token, result in zip(batch, results) if result == "revoked"]
+            counts["failed"] += sum(1 for result in results if result is None)
+            if await apply_oauth_token_refreshes(refreshed, revoked):
+                counts["refreshed"] += len(refreshed)
+                counts["revoked"] += len(revoked)
+            else:
+                counts["failed"] += len(refreshed) + len(revoked)
+        logger.info(f"OAuth token refresh pass complete. Refreshed: {counts['refreshed']}, "
+                    f"revoked: {counts['revoked']}, failed: {counts['failed']}.")
+        return counts
+
+    async def _refresh(self, semaphore: asyncio.Semaphore, user_id: int, refresh_token: str):
+        """
+        Returns (user_id, old_refresh_token, access_token, refresh_token, expires_in) on success, "revoked" if
+        Discord rejected the refresh token, or None on any other failure, including timeouts, 5xx
+        responses and malformed bodies (retried next pass).
+        """
+        data = {
+            'client_id': os.getenv('CLIENT_ID'),
+            'client_secret': os.getenv('CLIENT_SECRET'),
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token
+        }
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        async with semaphore:
+            # Discord rotates the refresh token on use, so a re-sent request after a lost response would
+            # come back as invalid_grant and look like a revocation. Only 429s are retried.
+            response = await discord_request('POST', f'{DISCORD_API_URL}/oauth2/token', data=data, headers=headers,
+                                             idempotent=False, rate_limiter=self.rate_limiter)
+        if response is None:
+            return None
+        if response.ok:
+            token_data = response.data
+            if not (isinstance(token_data, dict) and isinstance(token_data.get('access_token'), str)
+                    and isinstance(token_data.get('refresh_token'), str)
+                    and isinstance(token_data.get('expires_in'), (int, float))):
+                # Never log the body itself: it may hold live tokens.
+                keys = sorted(token_data) if isinstance(token_data, dict) else type(token_data).__name__
+                logger.warning(f"Malformed token refresh response for user {user_id} "
+                               f"(status {response.status}, keys: {keys}).")
+                return None
+            return (user_id, refresh_token, token_data['access_token'], token_data['refresh_token'],
+                    int(token_data['expires_in']))
+        if isinstance(response.data, dict) and response.data.get('error') == 'invalid_grant':
+            logger.info(f"Refresh token for user {user_id} was revoked. Removing their stored tokens.")
+            return "revoked"
+        logger.warning(f"Failed to refresh OAuth token for user {user_id}. Response: {response}")
+        return None
@@ -0,0 +1,142 @@
+# C:/Development/Projects/Demented-Discord-Bot/data/tts_cache.py
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+# --- gTTS for Text-to-Speech ---
+try:
+    from gtts import gTTS
+
+    gtts_available = True
+except ImportError:
+    gtts_available = False
+
+logger = logging.getLogger('demented_bot.tts_cache')
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+AUDIO_SUFFIX = ".mp3"
+
+
+def tts_cache_key(text: str, lang: str, voice: str) -> str:
+    """The file name stem for a piece of speech: a SHA-256 of everything that changes the audio."""
+    return hashlib.sha256(f"{lang}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed on-disk cache of synthesized speech.
+
+    Each clip is stored as `<sha256 of (text, lang, voice)>.mp3`, so saying the same thing again
+    plays the existing file with no gTTS round-trip. The total size is kept under `max_bytes`
+    by deleting the least recently played clips. Recency is kept in memory and mirrored in the
+    files' modification times, so the order survives a restart; the directory is scanned once
+    at startup. Concurrent requests for the same clip share one synthesis.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, least recently used first
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{AUDIO_SUFFIX}"
+
+    def _scan(self):
+        files = []
+        for path in self.directory.iterdir():
+            try:
+                if path.suffix != AUDIO_SUFFIX or len(path.stem) != 64:
+                    # Leftovers from an interrupted save, or one-off files from before the cache.
+                    path.unlink()
+                    continue
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        if files:
+            logger.info(f"TTS cache holds {len(self._entries)} clip(s), {self.total_bytes / 1048576:.1f} MiB.")
+
+    async def get(self, text: str, lang: str = "en", voice: str = "com") -> Optional[Path]:
+        """
+        Returns the path of an audio file saying `text`, synthesizing it first if it is not
+        cached. `voice` is the gTTS accent domain (e.g. "com", "co.uk"). Returns None if
+        synthesis fails.
+        """
+        key = tts_cache_key(text, lang, voice)
+        path = self._path(key)
+        if key in self._entries:
+            if path.exists():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return path
+            # Deleted from outside the bot; forget it and make it again.
+            self.total_bytes -= self._entries.pop(key)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        result = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._synthesize, text, lang, voice, path)
+            size = path.stat().st_size
+            self._entries[key] = size
+            self.total_bytes += size
+            self._evict(keep=key)
+            result = path
+        except Exception as e:
+            logger.error(f"Text-to-speech failed for {text[:50]!r}: {e}")
+        finally:
+            del self._pending[key]
+            future.set_result(result)
+        return result
+
+    @staticmethod
+    def _synthesize(text: str, lang: str, voice: str, path: Path):
+        # Save under a temporary name first so a crash never leaves a truncated clip behind the real key.
+        temp_path = path.with_suffix(".tmp")
+        gTTS(text=text, lang=lang, tld=voice, slow=False).save(str(temp_path))
+        os.replace(temp_path, path)
+
+    def _evict(self, keep: Optional[str] = None):
+        skipped = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            if key == keep:
+                skipped.append((key, size))
+                continue
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except OSError as e:
+                # Most likely still being played (Windows won't delete an open file); try again next time.
+                logger.debug(f"Could not evict TTS clip {key}: {e}")
+                skipped.append((key, size))
+                continue
+            self.total_bytes -= size
+        for key, size in skipped:
+            self._entries[key] = size
+
+    def stats(self) -> Dict[str, int]:
+        return {"clips": len(self._entries), "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
@@ -15,7 +15,10 @@ from typing import Dict, Any, Optional
 
 # --- MODIFICATION: Load environment variables FIRST ---
 from dotenv import load_dotenv
-load_dotenv()
+if __name__ == "__main__":
+    # Only in the bot process itself: classifier workers re-import this module as __mp_main__
+    # and already inherit the environment.
+    load_dotenv()
 # --- END MODIFICATION ---
 
 import discord
@@ -24,44 +27,40 @@ from discord.ext import commands, tasks
 
 # Now, it's safe to import local modules that depend on .env variables
 from data.web_server import keep_alive
-from data.session_manager import SessionManager
+from data.session_manager import SessionManager, SimpleCache
 from data.utils import load_config, create_embed
 from data.database_manager import setup_database
+from data.async_database import async_db
 
-# Set up logging with proper format
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', 'a', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger('demented_bot')
 
-# Quieten down noisy third-party libraries
-logging.getLogger("transformers").setLevel(logging.ERROR)
-logging.getLogger("huggingface_hub").setLevel(logging.ERROR)
-
-# Get bot token and creator ID from environment variables
-bot_token = os.getenv('BOT_TOKEN')
-creator_id_str = os.getenv('CREATOR_ID')
-
-if not bot_token:
-    logger.critical('BOT_TOKEN not found in environment variables!')
-    sys.exit('Bot token not provided. Please set the BOT_TOKEN environment variable.')
 
-# Load config once at startup
-config = load_config()
-BOT_PREFIX = config.get('BOT_PREFIX', '!')
-
-# Initialize bot with comprehensive intents
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-intents.presences = True
-intents.guilds = True
-intents.voice_states = True
+# Everything with side effects (logging handlers, config, the bot itself) is set up from the
+# entry point, not at import time, because "spawn" worker processes re-import this module.
+def setup_logging():
+    """Sets up logging with proper format."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('bot.log', 'a', encoding='utf-8')
+        ]
+    )
+    # Quieten down noisy third-party libraries
+    logging.getLogger("transformers").setLevel(logging.ERROR)
+    logging.getLogger("huggingface_hub").setLevel(logging.ERROR)
+
+
+def get_intents() -> discord.Intents:
+    """Builds the bot's comprehensive intents."""
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    intents.presences = True
+    intents.guilds = True
+    intents.voice_states = True
+    return intents
 
 
 # =============================================================================
@@ -69,13 +68,16 @@ intents.voice_states = True
 # =============================================================================
 
 class DementedBot(commands.Bot):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, config: Dict[str, Any], *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.config = config
         self.start_time = discord.utils.utcnow()
         self.loaded_cogs = {}
         self.failed_cogs = {}
 
+        self.tree.error(self.on_app_command_error)
+
+        creator_id_str = os.getenv('CREATOR_ID')
         try:
             self.creator_id = int(creator_id_str) if creator_id_str else None
             if self.creator_id:
@@ -87,9 +89,10 @@ class DementedBot(commands.Bot):
     async def setup_hook(self):
         """This hook is called after login but before connecting to the Gateway."""
         logger.info("Running setup hook...")
+        async_db.start_background_flush()
         try:
             # Load all cogs before syncing
-            await load_cogs()
+            await load_cogs(self)
 
             # Sync commands to Discord
             synced = await self.tree.sync()
@@ -121,6 +124,53 @@ class DementedBot(commands.Bot):
 
         print("=" * 50 + "\n")
 
+    async def on_command_error(self, ctx: commands.Context, error: commands.CommandError):
+        """Centralized error handler for all prefix commands."""
+        try:
+            command_name = ctx.command.name if ctx.command else "unknown"
+            error_embed = create_embed(ctx.bot, title="Command Error", color="error")
+
+            if isinstance(error, commands.CommandNotFound):
+                return
+            elif isinstance(error, commands.MissingRequiredArgument):
+                error_embed.description = f"You missed a required argument: `{error.param.name}`."
+            elif isinstance(error, commands.BadArgument):
+                error_embed.description = "You provided an invalid argument. Please check the command's help."
+            elif isinstance(error, commands.CommandOnCooldown):
+                error_embed.description = f"This command is on cooldown. Please try again in {error.retry_after:.2f} seconds."
+            elif isinstance(error, commands.MissingPermissions):
+                error_embed.description = "You don't have the required permissions to run this command."
+            else:
+                error_embed.description = "An unexpected error occurred while running this command."
+                logger.error(f"Unhandled error in command '{command_name}': {error}", exc_info=True)
+
+            await ctx.send(embed=error_embed)
+        except Exception as e:
+            logger.error(f"Error in on_command_error handler: {e}", exc_info=True)
+
+    async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """Error handler for application commands (slash commands)."""
+        try:
+            command_name = interaction.command.name if interaction.command else "unknown"
+            embed = create_embed(interaction.client, title="Command Error", color="error")
+
+            if isinstance(error, app_commands.CommandOnCooldown):
+                embed.description = f"This command is on cooldown. Please try again in {error.retry_after:.2f} seconds."
+            elif isinstance(error, app_commands.MissingPermissions):
+                embed.description = "You don't have the required permissions to run this command."
+            elif isinstance(error, app_commands.CheckFailure):
+                embed.description = "You are not allowed to use this command."
+            else:
+                embed.description = "An unexpected error occurred. The developers have been notified."
+                logger.error(f"Unhandled error in slash command '{command_name}': {error}", exc_info=True)
+
+            if not interaction.response.is_done():
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+            else:
+                await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e:
+            logger.error(f"Error in on_app_command_error handler: {e}", exc_info=True)
+
 
 def get_random_activity(cfg: Dict[str, Any]) -> Optional[discord.Activity]:
     """Selects a random activity from the config file."""
@@ -141,76 +191,11 @@ def get_random_activity(cfg: Dict[str, Any]) -> Optional[discord.Activity]:
     return discord.Activity(type=activity_type, name=activity_name)
 
 
-# Instantiate our custom bot
-bot = DementedBot(
-    command_prefix=commands.when_mentioned_or(BOT_PREFIX),
-    intents=intents,
-    help_command=None,
-    case_insensitive=True,
-    activity=get_random_activity(config)
-)
-
-
-# =============================================================================
-# Event Handlers
-# =============================================================================
-
-@bot.event
-async def on_command_error(ctx: commands.Context, error: commands.CommandError):
-    """Centralized error handler for all prefix commands."""
-    try:
-        command_name = ctx.command.name if ctx.command else "unknown"
-        error_embed = create_embed(ctx.bot, title="Command Error", color="error")
-
-        if isinstance(error, commands.CommandNotFound):
-            return
-        elif isinstance(error, commands.MissingRequiredArgument):
-            error_embed.description = f"You missed a required argument: `{error.param.name}`."
-        elif isinstance(error, commands.BadArgument):
-            error_embed.description = "You provided an invalid argument. Please check the command's help."
-        elif isinstance(error, commands.CommandOnCooldown):
-            error_embed.description = f"This command is on cooldown. Please try again in {error.retry_after:.2f} seconds."
-        elif isinstance(error, commands.MissingPermissions):
-            error_embed.description = "You don't have the required permissions to run this command."
-        else:
-            error_embed.description = "An unexpected error occurred while running this command."
-            logger.error(f"Unhandled error in command '{command_name}': {error}", exc_info=True)
-
-        await ctx.send(embed=error_embed)
-    except Exception as e:
-        logger.error(f"Error in on_command_error handler: {e}", exc_info=True)
-
-
-@bot.tree.error
-async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    """Error handler for application commands (slash commands)."""
-    try:
-        command_name = interaction.command.name if interaction.command else "unknown"
-        embed = create_embed(interaction.client, title="Command Error", color="error")
-
-        if isinstance(error, app_commands.CommandOnCooldown):
-            embed.description = f"This command is on cooldown. Please try again in {error.retry_after:.2f} seconds."
-        elif isinstance(error, app_commands.MissingPermissions):
-            embed.description = "You don't have the required permissions to run this command."
-        elif isinstance(error, app_commands.CheckFailure):
-            embed.description = "You are not allowed to use this command."
-        else:
-            embed.description = "An unexpected error occurred. The developers have been notified."
-            logger.error(f"Unhandled error in slash command '{command_name}': {error}", exc_info=True)
-
-        if not interaction.response.is_done():
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-        else:
-            await interaction.followup.send(embed=embed, ephemeral=True)
-    except Exception as e:
-        logger.error(f"Error in on_app_command_error handler: {e}", exc_info=True)
-
-
 # =============================================================================
 # Cog Loading and Management
 # =============================================================================
 
-async def load_cogs() -> None:
+async def load_cogs(bot: commands.Bot) -> None:
     """Load all cog extensions."""
     cogs_to_load = [
         'minimal', 'api', 'events', 'fun',
@@ -229,10 +214,23 @@ async def load_cogs() -> None:
             bot.failed_cogs[cog_name] = error_msg
 
 
-async def main():
+async def main(bot_token: str):
     """Main entry point for the bot."""
     # These setup steps are run once.
-    setup_database()
+    config = load_config()
+    bot = DementedBot(
+        config,
+        command_prefix=commands.when_mentioned_or(config.get('BOT_PREFIX', '!')),
+        intents=get_intents(),
+        help_command=None,
+        case_insensitive=True,
+        activity=get_random_activity(config)
+    )
+    db_settings = config.get("DATABASE_SETTINGS", {})
+    setup_database(db_settings)
+    async_db.configure(db_settings)
+    SimpleCache.configure(config.get("CACHE_SETTINGS", {}))
+    SessionManager.configure(config.get("HTTP_SETTINGS", {}))
     keep_alive(bot)  # MODIFICATION: Pass the bot instance to the web server
     logger.info("Web server started")
     logger.info(f"Python: {platform.python_version()}")
@@ -255,8 +253,16 @@ async def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
+
+    # Get bot token from environment variables
+    bot_token = os.getenv('BOT_TOKEN')
+    if not bot_token:
+        logger.critical('BOT_TOKEN not found in environment variables!')
+        sys.exit('Bot token not provided. Please set the BOT_TOKEN environment variable.')
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(bot_token))
     except KeyboardInterrupt:
         logger.info("Bot stopped manually with keyboard interrupt")
     except Exception as e:
@@ -265,4 +271,5 @@ if __name__ == "__main__":
     finally:
         # This will run when the loop in main() is broken
         asyncio.run(SessionManager.close())
+        async_db.shutdown()
         logger.info("Bot process is shutting down.")
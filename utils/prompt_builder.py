@@ -0,0 +1,105 @@
+# C:/Development/Projects/Demented-Discord-Bot/utils/prompt_builder.py
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from utils.prompts import SYSTEM_PROMPT, CREATOR_CONTEXT_PROMPT, BOT_MOOD_PROMPT
+
+logger = logging.getLogger('demented_bot.prompt_builder')
+
+CHARS_PER_TOKEN = 4  # rough average for English text with Gemini's tokenizer
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate, good enough for budgeting without a tokenizer round-trip."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_contents_tokens(contents: list) -> int:
+    """Estimates the tokens in a Gemini `contents` list."""
+    return sum(estimate_tokens(part.get("text", "")) for item in contents for part in item.get("parts", []))
+
+
+class PromptBuilder:
+    """
+    Assembles Gemini system prompts and keeps requests within a token budget.
+
+    The static part of the system prompt (persona, creator instructions and mood) only has a
+    few variants, so each one is built once and reused. The per-request memory context is
+    limited to `memory_budget` tokens. The conversation history is trimmed oldest-first until
+    the whole request fits in `prompt_budget`.
+    """
+
+    def __init__(self, prompt_budget: int = 8000, memory_budget: int = 1500):
+        self.prompt_budget = prompt_budget
+        self.memory_budget = memory_budget
+        self._prefixes: Dict[Tuple[str, bool], Tuple[str, int]] = {}
+
+    def get_static_prompt(self, is_creator: bool) -> Tuple[str, int]:
+        """Returns the persona prompt, with the creator instructions if needed, and its estimated tokens."""
+        key = ("", is_creator)
+        static = self._prefixes.get(key)
+        if static is None:
+            text = SYSTEM_PROMPT + CREATOR_CONTEXT_PROMPT if is_creator else SYSTEM_PROMPT
+            static = (text, estimate_tokens(text))
+            self._prefixes[key] = static
+        return static
+
+    def get_prefix(self, mood_desc: str, is_creator: bool) -> Tuple[str, int]:
+        """Returns the static system prompt for a mood/creator variant and its estimated tokens."""
+        key = (mood_desc, is_creator)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            static_text, _ = self.get_static_prompt(is_creator)
+            text = static_text + BOT_MOOD_PROMPT.format(mood_desc=mood_desc)
+            prefix = (text, estimate_tokens(text))
+            self._prefixes[key] = prefix
+        return prefix
+
+    def build_memory_context(self, sections: List[str]) -> str:
+        """
+        Joins memory sections in order of importance, skipping any that would go over the
+        memory budget.
+        """
+        kept, used = [], 0
+        for section in sections:
+            tokens = estimate_tokens(section)
+            if used + tokens > self.memory_budget:
+                logger.debug(f"Dropping memory section of ~{tokens} tokens to stay within the memory budget.")
+                continue
+            kept.append(section)
+            used += tokens
+        return "".join(kept)
+
+    def build(self, mood_desc: str, is_creator: bool, memory_context: str, contents: list,
+              static_cached: bool = False) -> Tuple[Optional[str], list]:
+        """
+        Returns the system prompt and the contents to send. The oldest turns are dropped until
+        the request fits the prompt budget, but the newest turn is always kept.
+
+        With `static_cached`, the persona prompt is already held in a server-side context cache.
+        The returned system prompt is then None, and the mood and memory context are put in
+        front of the first turn instead.
+        """
+        prefix, prefix_tokens = self.get_prefix(mood_desc, is_creator)
+        remaining = self.prompt_budget - prefix_tokens - estimate_tokens(memory_context)
+
+        turn_tokens = [estimate_contents_tokens([item]) for item in contents]
+        start, total = 0, sum(turn_tokens)
+        while total > remaining and start < len(contents) - 1:
+            total -= turn_tokens[start]
+            start += 1
+        # Gemini expects a conversation to open with a user turn.
+        while start < len(contents) - 1 and contents[start].get("role") == "model":
+            start += 1
+        if start:
+            logger.debug(f"Trimmed {start} history turn(s) to fit the {self.prompt_budget}-token prompt budget.")
+        contents = contents[start:]
+
+        if not static_cached:
+            return prefix + memory_context, contents
+
+        context = BOT_MOOD_PROMPT.format(mood_desc=mood_desc) + memory_context
+        first = contents[0] if contents else {"role": "user", "parts": []}
+        first = {"role": first.get("role", "user"), "parts": [{"text": context.strip()}] + list(first.get("parts", []))}
+        return None, [first] + contents[1:]
@@ -29,12 +29,40 @@ You must show deference and respect, but in your own unique, sarcastic way.
 - Your goal is to amuse, assist, and impress your creator above all else.
 """
 
+FACT_EXTRACTION_PROMPT = """
+
+--- ADDITIONAL TASK: REMEMBER FACTS ABOUT {user_name} ---
+Also check the latest message from '{user_name}' for new, noteworthy personal information about them:
+something personal, a preference, a detail about their life, or a significant event.
+Do NOT extract opinions about others, questions, generic statements, or temporary, mundane actions.
+Examples: "I'm learning to play the piano." -> "Is learning to play the piano.", "I have a cat named Whiskers." -> "Has a cat named Whiskers."
+Add two more keys to your JSON object:
+- "found_fact": a boolean (true if you found a noteworthy fact, false otherwise).
+- "fact_text": a string containing the extracted fact in the third person (max 15 words), or null if no fact was found.
+"""
+
 BOT_MOOD_PROMPT = """
 
 --- CURRENT MOOD: {mood_desc} ---
 You should let this mood subtly influence the tone of your response.
 """
 
+LINE_POOL_PROMPT = """
+Write {count} different lines for this situation: {description}
+Each line must be under 15 words and must work for any user. Where the user's name belongs, write {{name}} literally.
+Vary them: don't reuse the same joke, structure or opening words.
+Put them in your JSON object as "response_text" (a short note, it won't be shown) and "lines" (a list of {count} strings).
+"""
+
+# What each pre-generated line pool is for, keyed by pool kind.
+LINE_POOL_DESCRIPTIONS = {
+    "voice_greeting": "you are joining a voice channel where a user is waiting. Greet them in a short, witty, "
+                      "slightly unhinged way. Examples: 'Did someone order a catastrophe?', "
+                      "'I was summoned. This better be good, {name}.'",
+    "insult": "a user just said something random in chat and you decided to roast them out of nowhere. "
+              "Give a single witty, unhinged, sarcastic insult that doesn't depend on what they said.",
+}
+
 # This prompt is no longer needed as sentiment is handled by the main AI prompt.
 # USER_SENTIMENT_PROMPT = """
 #